@@ -1,115 +1,133 @@
-import json
 import logging
 import asyncio
+import time
 
+# Imported first: starts the cold-start clock.
+from metrics.startup import startup_profile
 from memory.memory import MemoryHookProvider
-from bedrock_agentcore.memory.session import MemorySessionManager
+from memory.cache import SessionTurnCache, TurnCacheRegistry
+from memory.writer import MemoryWriter
+from prompt.prompt import PromptAssembler
+from streaming.streaming import StreamingQueue, current_queue
+from streaming.replay import EventLog, EventLogRegistry
+from mcp_pool.mcp_pool import McpConnection, McpConnectionPool
+from auth.token_cache import TokenCache
+from retrieval.speculative import SpeculativeRetrieval
+from retrieval.deadline import Deadline, DeadlineClient, deadline_from_payload, with_deadline
+from retrieval.rewriter import QueryRewriter, Rewrite
+from metrics.timing import LoggingSink, RunTimings
+from template.template import AgentTemplate
+from bedrock_agentcore.memory.session import MemorySession, MemorySessionManager
 from bedrock_agentcore import BedrockAgentCoreApp
-from bedrock_agentcore.identity.auth import requires_access_token
+from bedrock_agentcore.runtime.context import RequestContext
 from strands import Agent
-from strands_tools import mcp_client
+
+startup_profile.mark("imports")
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 MEMORY_ID = "[Agentcore_Memory_Id]"
+# Start get_passages/get_answer with the user's prompt before the model asks for them.
+SPECULATIVE_RETRIEVAL = True
+# Send a {"timings": {phase: ms}} event at the end of every stream.
+EMIT_TIMINGS = True
+# AgentCore only forwards X-Amzn-Bedrock-AgentCore-Runtime-Custom-* headers,
+# so Last-Event-ID travels in this one (or as "last_event_id" in the payload).
+LAST_EVENT_ID_HEADER = "X-Amzn-Bedrock-AgentCore-Runtime-Custom-Last-Event-Id"
 app = BedrockAgentCoreApp()
+# Phase latency histograms of every invocation, logged once a minute.
+metrics_sink = LoggingSink()
+# MCP connections and tool schemas shared across invocations in this container.
+mcp_pool = McpConnectionPool()
+# Recent stream events per runtime session, replayed to clients that reconnect.
+event_logs = EventLogRegistry()
+# 3LO access tokens per runtime session, reused until shortly before they expire.
+token_cache = TokenCache()
+# Recent conversation turns per memory session, read from AgentCore Memory once.
+turn_caches = TurnCacheRegistry()
+# Writes conversation turns to AgentCore Memory off the response path.
+memory_writer = MemoryWriter(metrics_sink=metrics_sink)
+# Resolves follow-ups ("does it support SSO?") from recent turns without a model call.
+query_rewriter = QueryRewriter()
+# Static system prompt computed once, plus token-budgeted recent conversation.
+prompt_assembler = PromptAssembler()
+# Built on first use (or by warm_up): each costs a boto3 client, so one per container.
+agent_template = None
+session_manager = None
+_fetch_token_3LO = None
 
 def build_system_prompt() -> str:
-    return f"""You are a support expert.
-
-               Important behavioral rule:
-                - You have no internal or pretrained knowledge.
-                - You must only use the information provided by the tools you have access and the recent conversation.
-                - Treat your internal knowledge base as empty.
-                - Never use general world knowledge, assumptions, or reasoning beyond what is explicitly provided.
-                - Do not perform web searches or draw from any external sources.
-                - For maximum efficiency, whenever you need to perform multiple independent operations, invoke all relevant tools simultaneously rather than sequentially.
-
-               If the tools and recent conversation contain no relevant information, respond with:
-                - Simply say: “I don’t have that information in the provided context.”
-                - Do not mention or summarize what was found or not found in any search, tool output, or retrieved data.
-                - Never reference search results, documents, or tool outputs when explaining what you don’t know.
-
-               Answering rules:
-                - No Internal : NEVER include <thinking>, <reasoning>, or any XML-style tags in your response. Keep all reasoning internal.
-                - Use only information retrieved from tools or stated in the conversation.
-                - Do not include meta phrases like “based on the retrieved documents”, “according to the context”, ”Based on the search results”, “The search results“, ”Based on ...” or “the tool says.” Just give the answer directly.
-                - Always check if the answer already exists in the conversation before using tools.
-                - You may use multiple tools or call the same tool multiple times if necessary.
-                - Be concise (target ~500 words maximum).
-                - If unsure, admit uncertainty and ask the user to clarify or rephrase.
-
-               Follow-up query rule:
-                - End each answer with a single, concise follow-up question that helps deepen or extend the topic naturally.
-
-               Rephrasing rule for tool queries:
-                - Always rephrase the query to include relevant specifics (e.g., part, model, product, name) found in the recent conversation.
-                - If the query is already specific, use it as-is.
-                - Return only the rephrased query — no extra commentary.
-
-               Summary:
-                - Use only recent conversation and MCP tool results.
-                - No world knowledge.
-                - No assumptions.
-                - No web searches.
-                - Be concise, direct, and contextually grounded.
-
-               Available Tools
-                get_answer
-                - **Use for**: Direct factual questions, definitions, how-to queries
-                - **Returns**: Curated answer with citations from Coveo Answer API
-                - **Best for**: Single, focused questions with clear answers
-
-                get_passages
-                - **Use for**: Detailed explanations, comparisons, multi-step processes
-                - **Returns**: Relevant passages with full context and metadata
-                - **Best for**: Complex questions requiring synthesis from multiple sources
-
-                search
-                - **Use for**: Broad exploration, finding multiple resources
-                - **Returns**: Ranked search results with excerpts
-                - **Best for**: Open-ended or exploratory queries
-
-               ### Recent conversation:
-            """
-
-class StreamingQueue:
-    def __init__(self):
-        self._q = asyncio.Queue()
-        self._finished = False
-
-    async def put_event(self, obj: dict):
-        await self._q.put(json.dumps(obj))
-
-    async def put_text(self, text: str):
-        await self._q.put(text)
-
-    async def finish(self):
-        self._finished = True
-        await self._q.put(None)
-
-    async def stream(self):
-        while True:
-            item = await self._q.get()
-            if item is None and self._finished:
-                break
-            yield item
-
-queue = StreamingQueue()
+    return prompt_assembler.render([])
+
+def get_agent_template() -> AgentTemplate:
+    global agent_template
+    if agent_template is None:
+        agent_template = AgentTemplate(build_system_prompt())
+    return agent_template
+
+def get_session_manager() -> MemorySessionManager:
+    global session_manager
+    if session_manager is None:
+        session_manager = MemorySessionManager(memory_id=MEMORY_ID, region_name="us-east-1")
+    return session_manager
+
+def warm_up() -> None:
+    """Build the shared clients before serving, so the first invocation does not pay for them."""
+    with startup_profile.phase("session_manager"):
+        get_session_manager()
+    with startup_profile.phase("agent_template"):
+        get_agent_template()
+    startup_profile.log()
 
 async def on_auth_url(url: str) -> None:
-    await queue.put_event({"auth_url": url})
-
-@requires_access_token(
-    provider_name="[Agentcore_Identity_Provider_Name]",
-    scopes=["full"],
-    auth_flow="USER_FEDERATION",
-    on_auth_url=on_auth_url,
-    force_authentication=False,
-)
-async def need_token_3LO_async(*, access_token: str) -> str:
-    return access_token
+    queue = current_queue.get()
+    if queue is not None:
+        await queue.put_event({"auth_url": url})
+
+def build_fetch_token_3LO():
+    # Deferred: requires_access_token creates its identity client (two boto3 clients) when applied,
+    # and it is only needed when the token cache misses.
+    from bedrock_agentcore.identity.auth import requires_access_token
+
+    @requires_access_token(
+        provider_name="[Agentcore_Identity_Provider_Name]",
+        scopes=["full"],
+        auth_flow="USER_FEDERATION",
+        on_auth_url=on_auth_url,
+        force_authentication=False,
+    )
+    async def fetch_token_3LO(*, access_token: str) -> str:
+        return access_token
+
+    return fetch_token_3LO
+
+async def need_token_3LO_async() -> str:
+    global _fetch_token_3LO
+    if _fetch_token_3LO is None:
+        _fetch_token_3LO = await asyncio.to_thread(build_fetch_token_3LO)
+    return await _fetch_token_3LO()
+
+async def get_access_token(cache_key: tuple) -> str:
+    token = token_cache.get(cache_key)
+    if token is None:
+        token = await need_token_3LO_async()
+        token_cache.put(cache_key, token)
+    return token
+
+def get_last_event_id(payload: dict, context: RequestContext):
+    last_event_id = (payload or {}).get("last_event_id")
+    if last_event_id is None:
+        headers = getattr(context, "request_headers", None) or {}
+        last_event_id = next((v for k, v in headers.items() if k.lower() == LAST_EVENT_ID_HEADER.lower()), None)
+    if last_event_id is None:
+        return None
+    try:
+        return int(last_event_id)
+    except (TypeError, ValueError):
+        # The client did resume, so replay from the first buffered event rather than start a new run.
+        logger.warning(f"Ignoring malformed last event id {last_event_id!r}, replaying from the start")
+        return 0
 
 def extract_text(maybe_msg):
     if isinstance(maybe_msg, str):
@@ -119,81 +137,135 @@ def extract_text(maybe_msg):
     except Exception:
         return None
 
-async def load_mcp_client(queue: StreamingQueue, agent: Agent, url: str) -> None:
+async def load_mcp_client(queue: StreamingQueue, url: str, token_key: tuple, timings: RunTimings) -> McpConnection:
     await queue.put_event({"status": "Loading mcp server..."})
-    token = await need_token_3LO_async()
-
-    await queue.put_text({"status":"Connecting to MCP and loading tools..."})
-    await asyncio.to_thread(
-        agent.tool.mcp_client,
-        action="connect",
-        connection_id="coveo_mcp",
-        transport="streamable_http",
-        server_url=url,
-        headers={"Authorization": f"Bearer {token}"},
-        timeout=60,
-    )
+    with timings.span("auth_token"):
+        token = await get_access_token(token_key)
 
-    await asyncio.to_thread(
-        agent.tool.mcp_client,
-        action="load_tools",
-        connection_id="coveo_mcp",
-    )
-    await queue.put_text({"status": "Mcp tools loaded."})
+    await queue.put_event({"status":"Connecting to MCP and loading tools..."})
+    connection = await mcp_pool.acquire(url, token, timings)
+    await queue.put_event({"status": "Mcp tools loaded."})
+    return connection
 
-async def agent_task(prompt: str, queue:StreamingQueue, agent:Agent, url:str) -> None:
+async def rewrite_query(prompt: str, turn_cache: SessionTurnCache, user_session: MemorySession, timings: RunTimings) -> Rewrite:
     try:
-        await load_mcp_client(queue=queue, agent=agent, url=url)
-        await queue.put_event({"status": "Generating Answer..."})
-        async for chunk in agent.stream_async(f"Answer this query: <query>{prompt}</query>"):
-            if "data" in chunk:
-                logger.error(f"Chunk data: {chunk}")
-                await queue.put_event({"answer": chunk["data"]})
-            elif "message" in chunk:
-                message = chunk["message"]
-
-                if "content" in message:
-                    for item in message["content"]:
-                        if "toolUse" in item:
-                            tool_use = item["toolUse"]
-                            agent_tool = tool_use.get("name")
-                            tool_args = tool_use.get("input", {}).get("tool_args", {})
-                            tool_name = tool_use.get("input", {}).get("tool_name", {})
-                            query = tool_args.get("query")
-
-                            await queue.put_event({
-                                "status": f"Agent used: {agent_tool}, Tool: {tool_name}, Query: {query}"
-                            })
+        if not turn_cache.loaded:
+            with timings.span("memory_get_last_k_turns"):
+                await asyncio.to_thread(turn_cache.load, user_session)
+    except Exception as e:
+        logger.error(f"Memory load error: {e}")
+    _, recent_turns = turn_cache.snapshot()
+    with timings.span("query_rewrite"):
+        return query_rewriter.rewrite(prompt, recent_turns)
+
+def create_agent(user_session: MemorySession, user_id: str, session_id: str, tools: list, timings: RunTimings) -> Agent:
+    return get_agent_template().create(
+        tools=tools,
+        hooks=[MemoryHookProvider(user_session, turn_caches.get(user_id, session_id), memory_writer, prompt_assembler, timings)],
+        state={"actor_id": user_id, "session_id": session_id},
+    )
 
+async def agent_task(prompt: str, queue:StreamingQueue, user_session: MemorySession, user_id: str, session_id: str, url:str, deadline: Deadline, timings: RunTimings) -> None:
+    connection = None
+    speculation = None
+    try:
+        async with asyncio.timeout(deadline.remaining()):
+            # Read the recent turns while connecting to MCP; the memory hook then finds them cached.
+            rewriting = asyncio.create_task(rewrite_query(prompt, turn_caches.get(user_id, session_id), user_session, timings))
+            connection = await load_mcp_client(queue=queue, url=url, token_key=(user_id, session_id), timings=timings)
+            rewrite = await rewriting
+            logger.info(f"Query rewrite ({rewrite.confidence}): {rewrite.reason}")
+            message = f"Answer this query: <query>{prompt}</query>"
+            search_query = prompt
+            if rewrite.rewritten and rewrite.confidence >= query_rewriter.confidence_threshold:
+                # Confident enough to skip the model's own rephrasing of the tool query.
+                search_query = rewrite.query
+                message += f"\n<search_query>{search_query}</search_query>"
+            # Every MCP tool call gets at most the time left before the deadline.
+            client = DeadlineClient(connection.client, deadline)
+            tools = with_deadline(connection.tools, client)
+            if SPECULATIVE_RETRIEVAL:
+                # Fire the retrieval tools now; the model's matching calls are served from these results.
+                speculation = SpeculativeRetrieval(client)
+                speculation.start(search_query, tools)
+                tools = speculation.wrap(tools)
+                await asyncio.sleep(0)
+            tools = timings.wrap_tools(tools)
+            with timings.span("agent_setup"):
+                agent = create_agent(user_session, user_id, session_id, tools, timings)
+            await queue.put_event({"status": "Generating Answer..."})
+            model_started = time.perf_counter()
+            first_token = True
+            async for chunk in agent.stream_async(message):
+                if "data" in chunk:
+                    if first_token:
+                        first_token = False
+                        timings.record("model_first_token", (time.perf_counter() - model_started) * 1000)
+                        timings.record("first_token", timings.elapsed_ms())
+                    logger.error(f"Chunk data: {chunk}")
+                    await queue.put_answer(chunk["data"])
+                elif "message" in chunk:
+                    message = chunk["message"]
+
+                    if "content" in message:
+                        for item in message["content"]:
+                            if "toolUse" in item:
+                                tool_use = item["toolUse"]
+                                agent_tool = tool_use.get("name")
+                                query = tool_use.get("input", {}).get("query")
+
+                                await queue.put_event({
+                                    "status": f"Agent used: {agent_tool}, Query: {query}"
+                                })
+
+    except TimeoutError:
+        await queue.put_event({"error": "The answer took longer than the request deadline."})
     except Exception as e:
         await queue.put_event({"error": str(e)})
     finally:
+        timings.record("turn", timings.elapsed_ms())
+        if EMIT_TIMINGS:
+            await queue.put_event({"timings": timings.summary()})
         await queue.finish()
-        await agent.tool.mcp_client(action="disconnect", connection_id="coveo_mcp")
+        if speculation is not None:
+            speculation.cancel()
+            logger.info(f"Speculative retrieval: {speculation.stats()}")
+        if connection is not None:
+            mcp_pool.release(connection)
 
 @app.entrypoint
-async def invoke(payload) -> dict:
+async def invoke(payload, context: RequestContext) -> dict:
     user_message = (payload or {}).get("prompt", "")
     user_id= (payload or {}).get("user_id", "coveo_user")
-    session_id= (payload or {}).get("session_id", "")
+    # Prefer the runtime session id: it comes from the invocation header, not the body.
+    session_id= getattr(context, "session_id", None) or (payload or {}).get("session_id", "")
     mcp_url = (payload or {}).get("mcp_url", "")
 
-    queue.put_event({"status": str(payload)})
-    session_manager = MemorySessionManager(memory_id=MEMORY_ID, region_name="us-east-1")
-    user_session = session_manager.create_memory_session(actor_id=user_id, session_id=session_id)
+    last_event_id = get_last_event_id(payload, context)
+    if last_event_id is not None:
+        # Reconnect: continue the stream from the buffer instead of invoking the model again.
+        logger.info(f"Resuming stream of session {session_id} after event {last_event_id}")
+        return (event_logs.find(session_id) or EventLog()).replay(last_event_id)
 
-    agent = Agent(
-        tools=[mcp_client],
-        hooks=[MemoryHookProvider(user_session)],
-        state={"actor_id": user_id, "session_id": session_id},
-        system_prompt=build_system_prompt(),
-    )
+    deadline = deadline_from_payload(payload)
+    timings = RunTimings(metrics_sink)
+
+    queue = StreamingQueue(log=event_logs.get(session_id))
+    current_queue.set(queue)
+    await queue.put_event({"status": str(payload)})
+    user_session = get_session_manager().create_memory_session(actor_id=user_id, session_id=session_id)
 
-    asyncio.create_task(agent_task(prompt=user_message, agent=agent, queue=queue, url=mcp_url))
+    queue.attach(asyncio.create_task(agent_task(
+        prompt=user_message, queue=queue, user_session=user_session, user_id=user_id, session_id=session_id, url=mcp_url,
+        deadline=deadline, timings=timings,
+    )))
 
     return queue.stream()
 
+startup_profile.mark("module_setup")
+
 def main():
+    warm_up()
     app.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+# Tokens that carry no readable expiry are kept this long.
+DEFAULT_TOKEN_TTL_SECONDS = 300
+# Tokens are considered expired this long before their actual expiry.
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """Return the `exp` claim of a JWT access token, or None if it is not a JWT."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return None
+
+
+class TokenCache:
+    """Access tokens cached until shortly before they expire.
+
+    At most max_entries tokens are kept; the least recently used one is
+    dropped first, and expired ones are purged whenever a token is stored.
+    """
+
+    def __init__(
+        self,
+        refresh_margin_seconds: float = TOKEN_REFRESH_MARGIN_SECONDS,
+        default_ttl_seconds: float = DEFAULT_TOKEN_TTL_SECONDS,
+        max_entries: int = 1024,
+    ):
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.default_ttl_seconds = default_ttl_seconds
+        self.max_entries = max_entries
+        self._tokens: "OrderedDict[Hashable, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is None:
+                return None
+            token, expires_at = entry
+            if expires_at - self.refresh_margin_seconds <= time.time():
+                del self._tokens[key]
+                return None
+            self._tokens.move_to_end(key)
+            return token
+
+    def put(self, key: Hashable, token: str, expires_at: Optional[float] = None) -> None:
+        if expires_at is None:
+            expires_at = token_expiry(token) or time.time() + self.default_ttl_seconds
+        with self._lock:
+            refresh_at = time.time() + self.refresh_margin_seconds
+            for expired in [k for k, (_, expiry) in self._tokens.items() if expiry <= refresh_at]:
+                del self._tokens[expired]
+            self._tokens[key] = (token, expires_at)
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.max_entries:
+                self._tokens.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._tokens.pop(key, None)
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from strands.tools.mcp import MCPClient
+
+try:
+    from mcp.client.streamable_http import streamablehttp_client
+except ImportError:
+    # mcp 2.x replaced it with streamable_http_client, which takes a configured HTTP client.
+    from mcp.client.streamable_http import create_mcp_http_client, streamable_http_client
+    streamablehttp_client = None
+
+from auth.token_cache import token_expiry
+from metrics.timing import RunTimings
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def _http_client_transport(url: str, headers: Dict[str, str]):
+    async with create_mcp_http_client(headers=headers) as http_client:
+        async with streamable_http_client(url, http_client=http_client) as streams:
+            yield streams
+
+
+def streamable_http_transport(url: str, headers: Dict[str, str]):
+    """Streamable HTTP transport to url sending headers, on the mcp 1.x and 2.x lines."""
+    if streamablehttp_client is not None:
+        return streamablehttp_client(url, headers=headers)
+    return _http_client_transport(url, headers)
+
+
+@dataclass
+class McpConnection:
+    url: str
+    client: MCPClient
+    tools: List = field(default_factory=list)
+    expires_at: Optional[float] = None
+    last_used: float = field(default_factory=time.monotonic)
+    in_use: int = 0
+    # Dropped from the pool while a run was using it; closed once released.
+    retired: bool = False
+
+
+class McpConnectionPool:
+    """Keeps started MCP clients and their tool schemas per (mcp_url, user token).
+
+    Follow-up turns reuse the connection and the cached tools instead of
+    running connect + load_tools again. Connections are health-checked when
+    they have been idle for a while, dropped shortly before the access token
+    expires, and closed once idle for longer than max_idle_seconds.
+    """
+
+    def __init__(
+        self,
+        max_idle_seconds: float = 600,
+        healthcheck_after_seconds: float = 30,
+        token_expiry_margin_seconds: float = 60,
+    ):
+        self.max_idle_seconds = max_idle_seconds
+        self.healthcheck_after_seconds = healthcheck_after_seconds
+        self.token_expiry_margin_seconds = token_expiry_margin_seconds
+        self._connections: Dict[Tuple[str, str], McpConnection] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        # Closes started by release(); referenced here so they are not garbage collected midway.
+        self._closing: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _key(url: str, token: str) -> Tuple[str, str]:
+        return url, hashlib.sha256(token.encode()).hexdigest()
+
+    def _expired(self, connection: McpConnection) -> bool:
+        return connection.expires_at is not None and connection.expires_at - self.token_expiry_margin_seconds <= time.time()
+
+    async def acquire(self, url: str, token: str, timings: Optional[RunTimings] = None) -> McpConnection:
+        """Return a healthy connection for url/token, connecting on first use."""
+        timings = timings or RunTimings()
+        await self.evict_idle()
+        key = self._key(url, token)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            connection = self._connections.get(key)
+            if connection is not None and (self._expired(connection) or not await self._healthy(connection, timings)):
+                self._connections.pop(key, None)
+                await self._retire(connection)
+                connection = None
+
+            if connection is None:
+                connection = await self._connect(url, token, timings)
+                self._connections[key] = connection
+
+            connection.in_use += 1
+            connection.last_used = time.monotonic()
+            return connection
+
+    def release(self, connection: McpConnection) -> None:
+        connection.in_use -= 1
+        connection.last_used = time.monotonic()
+        if connection.retired and not connection.in_use:
+            task = asyncio.ensure_future(self._close(connection))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def _retire(self, connection: McpConnection) -> None:
+        """Close a connection dropped from the pool, or leave that to release() if a run still uses it."""
+        if connection.in_use:
+            connection.retired = True
+        else:
+            await self._close(connection)
+
+    async def evict_idle(self) -> None:
+        now = time.monotonic()
+        for key, connection in list(self._connections.items()):
+            if connection.in_use:
+                continue
+            if now - connection.last_used > self.max_idle_seconds or self._expired(connection):
+                self._connections.pop(key, None)
+                await self._close(connection)
+        # One lock per token hash: drop those of keys that left the pool, unless a caller holds or waits on them.
+        for key in [key for key, lock in self._locks.items() if key not in self._connections and not lock.locked()]:
+            del self._locks[key]
+
+    async def close(self) -> None:
+        connections = list(self._connections.values())
+        self._connections.clear()
+        for connection in connections:
+            await self._close(connection)
+        await asyncio.gather(*self._closing)
+
+    async def _connect(self, url: str, token: str, timings: RunTimings) -> McpConnection:
+        client = MCPClient(lambda: streamable_http_transport(
+            url,
+            headers={"Authorization": f"Bearer {token}"},
+        ))
+        with timings.span("mcp_connect"):
+            await asyncio.to_thread(client.start)
+        try:
+            with timings.span("mcp_load_tools"):
+                tools = await asyncio.to_thread(client.list_tools_sync)
+        except Exception:
+            await asyncio.to_thread(client.stop, None, None, None)
+            raise
+        logger.info(f"Connected to MCP server {url}, {len(tools)} tools loaded")
+        return McpConnection(url=url, client=client, tools=list(tools), expires_at=token_expiry(token))
+
+    async def _healthy(self, connection: McpConnection, timings: RunTimings) -> bool:
+        """Ping connections that sat idle; listing tools also refreshes the cached schemas."""
+        if time.monotonic() - connection.last_used < self.healthcheck_after_seconds:
+            return True
+        try:
+            with timings.span("mcp_healthcheck"):
+                connection.tools = list(await asyncio.to_thread(connection.client.list_tools_sync))
+            return True
+        except Exception as e:
+            logger.warning(f"MCP connection to {connection.url} failed its health check: {e}")
+            return False
+
+    async def _close(self, connection: McpConnection) -> None:
+        try:
+            await asyncio.to_thread(connection.client.stop, None, None, None)
+        except Exception as e:
+            logger.warning(f"Failed to close MCP connection to {connection.url}: {e}")
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from bedrock_agentcore.memory.session import MemorySession
+
+Turn = List[Tuple[str, str]]
+
+
+def normalize_message(message) -> Tuple[str, str]:
+    """Return (role, text) for a message returned by get_last_k_turns."""
+    if hasattr(message, 'role') and hasattr(message, 'content'):
+        role = message['role']
+        content = message['content']
+    else:
+        role = message.get('role', 'unknown')
+        content = message.get('content', {})
+    if isinstance(content, dict):
+        content = content.get('text', '')
+    return role, content
+
+
+class SessionTurnCache:
+    """In-process copy of the last k conversation turns of one memory session.
+
+    The window is read from AgentCore Memory once; turns stored afterwards are
+    applied locally as well (write-through), and `version` changes only when
+    the window does, so callers can skip rebuilding prompts otherwise.
+    """
+
+    def __init__(self, k: int = 3):
+        self.k = k
+        self.version = 0
+        self._turns: Optional[List[Turn]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._turns is not None
+
+    def load(self, memory_session: MemorySession) -> None:
+        if self.loaded:
+            return
+        recent_turns = memory_session.get_last_k_turns(k=self.k)
+        with self._lock:
+            if self._turns is None:
+                self._turns = [[normalize_message(message) for message in turn] for turn in recent_turns or []]
+                self.version += 1
+
+    def append(self, role: str, text: str) -> None:
+        """Apply a message that was just written to AgentCore Memory."""
+        with self._lock:
+            if self._turns is None:
+                # Not loaded yet: the first load will read this message remotely.
+                return
+            if role == "USER" or not self._turns:
+                self._turns.append([(role, text)])
+            else:
+                self._turns[-1].append((role, text))
+            del self._turns[:-self.k]
+            self.version += 1
+
+    def snapshot(self) -> Tuple[int, List[Turn]]:
+        with self._lock:
+            return self.version, [list(turn) for turn in self._turns or []]
+
+
+class TurnCacheRegistry:
+    """Bounded, least recently used set of SessionTurnCache per (actor_id, session_id)."""
+
+    def __init__(self, max_sessions: int = 1024, k: int = 3):
+        self.max_sessions = max_sessions
+        self.k = k
+        self._caches: "OrderedDict[Tuple[str, str], SessionTurnCache]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, actor_id: str, session_id: str) -> SessionTurnCache:
+        key = (actor_id, session_id)
+        with self._lock:
+            cache = self._caches.get(key)
+            if cache is None:
+                cache = self._caches[key] = SessionTurnCache(k=self.k)
+            self._caches.move_to_end(key)
+            while len(self._caches) > self.max_sessions:
+                self._caches.popitem(last=False)
+            return cache
@@ -3,34 +3,45 @@ import logging
 from bedrock_agentcore.memory.session import MemorySession
 from bedrock_agentcore.memory.constants import ConversationalMessage, MessageRole
 import re
+from typing import Optional
+
+from memory.cache import SessionTurnCache
+from memory.writer import MemoryWriter
+from prompt.prompt import PromptAssembler
+from metrics.timing import RunTimings
 
 logger = logging.getLogger(__name__)
 
 class MemoryHookProvider(HookProvider):
-    def __init__(self, memory_session: MemorySession):
+    def __init__(
+        self,
+        memory_session: MemorySession,
+        turn_cache: Optional[SessionTurnCache] = None,
+        writer: Optional[MemoryWriter] = None,
+        prompt_assembler: Optional[PromptAssembler] = None,
+        timings: Optional[RunTimings] = None,
+    ):
         self.memory_session = memory_session
+        self.turn_cache = turn_cache or SessionTurnCache()
+        # When set, turns are persisted in the background instead of inside the hook.
+        self.writer = writer
+        self.prompt_assembler = prompt_assembler or PromptAssembler()
+        self.timings = timings or RunTimings()
+        self._applied_version = None
     
     def retrieve_context(self, event: MessageAddedEvent):
         logger.info(f"✅ Loaded on_agent_initialized")
         try:
-            recent_turns = self.memory_session.get_last_k_turns(k=3)
-            
+            if not self.turn_cache.loaded:
+                with self.timings.span("memory_get_last_k_turns"):
+                    self.turn_cache.load(self.memory_session)
+            version, recent_turns = self.turn_cache.snapshot()
+            if version == self._applied_version:
+                return
+            self._applied_version = version
+
             if recent_turns:
-                context_messages = []
-                for turn in recent_turns:
-                    for message in turn:
-                        if hasattr(message, 'role') and hasattr(message, 'content'):
-                            role = message['role']
-                            content = message['content']
-                        else:
-                            role = message.get('role', 'unknown')
-                            content = message.get('content', {}).get('text', '')
-                        context_messages.append(f"{role}: {content}")
-                
-                context = "\n".join(context_messages)
-                
-                event.agent.system_prompt = event.agent.system_prompt.split("### Recent conversation:")[0]
-                event.agent.system_prompt += f"\n\n### Recent conversation:\n{context}"
+                event.agent.system_prompt = self.prompt_assembler.render(recent_turns)
                 logger.info(f"✅ Loaded {len(recent_turns)} conversation turns using MemorySession")
                 
         except Exception as e:
@@ -51,11 +62,15 @@ class MemoryHookProvider(HookProvider):
 
                 logger.error(f"Storing message. Role: {message_role.value}, Text: {message_text}")
 
-               
-                result = self.memory_session.add_turns(
-                    messages=[ConversationalMessage(message_text, message_role)]
-                )
-                
+                message = ConversationalMessage(message_text, message_role)
+                self.turn_cache.append(message_role.value, message_text)
+
+                if self.writer is not None:
+                    self.writer.submit(self.memory_session, message)
+                    return
+
+                with self.timings.span("memory_add_turns"):
+                    result = self.memory_session.add_turns(messages=[message])
                 event_id = result['eventId']
                 logger.info(f"✅ Stored message with Event ID: {event_id}, Role: {message_role.value}")
                 
@@ -0,0 +1,140 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from bedrock_agentcore.memory.session import MemorySession
+from bedrock_agentcore.memory.constants import ConversationalMessage
+
+from metrics.timing import MetricsSink
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MemoryWriter:
+    """Persists conversation turns to AgentCore Memory off the response path.
+
+    Messages are queued by save_interaction and written by a background
+    thread. Messages queued for the same (actor_id, session_id) are
+    coalesced into one add_turns call, whichever turn's MemorySession
+    queued them. Failed writes are retried with bounded exponential
+    backoff, and pending messages are flushed when the process exits.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 25,
+        max_retries: int = 3,
+        backoff_base_seconds: float = 0.2,
+        backoff_max_seconds: float = 2.0,
+        shutdown_timeout_seconds: float = 10.0,
+        metrics_sink: Optional[MetricsSink] = None,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.shutdown_timeout_seconds = shutdown_timeout_seconds
+        # Writes happen after the run has answered, so they go to the sink rather than a RunTimings.
+        self.metrics_sink = metrics_sink
+
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_write_latency_ms = 0.0
+        self.total_write_latency_ms = 0.0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, memory_session: MemorySession, message: ConversationalMessage) -> None:
+        self._queue.put((memory_session, message))
+
+    def close(self) -> None:
+        """Write every queued message, then stop the writer thread; runs at exit."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(self.shutdown_timeout_seconds)
+        if self._thread.is_alive():
+            logger.error(f"Memory writer stopped with {self._queue.qsize()} messages still queued")
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_write_latency_ms": self.last_write_latency_ms,
+            "avg_write_latency_ms": self.total_write_latency_ms / self.batches if self.batches else 0.0,
+        }
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            items = [self._queue.get()]
+            while len(items) < self.max_batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if _STOP in items:
+                stopping = True
+            pending = [item for item in items if item is not _STOP]
+            try:
+                for memory_session, messages in self._group_by_session(pending):
+                    self._write(memory_session, messages)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _group_by_session(items) -> List[Tuple[MemorySession, List[ConversationalMessage]]]:
+        """Coalesce the messages of each (actor_id, session_id), keeping their order.
+
+        invoke creates a new MemorySession per turn, so sessions are told apart
+        by their ids rather than by object identity.
+        """
+        groups = {}
+        for memory_session, message in items:
+            key = (memory_session["actorId"], memory_session["sessionId"])
+            if key in groups:
+                groups[key][1].append(message)
+            else:
+                groups[key] = (memory_session, [message])
+        return list(groups.values())
+
+    def _write(self, memory_session: MemorySession, messages: List[ConversationalMessage]) -> None:
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                result = memory_session.add_turns(messages=messages)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += len(messages)
+                    logger.error(f"Memory save error, dropping {len(messages)} messages: {e}")
+                    return
+                delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt)
+                logger.warning(f"Memory save failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                continue
+
+            latency_ms = (time.perf_counter() - start) * 1000
+            self.written += len(messages)
+            self.batches += 1
+            self.last_write_latency_ms = latency_ms
+            self.total_write_latency_ms += latency_ms
+            if self.metrics_sink is not None:
+                self.metrics_sink.record("memory_add_turns", latency_ms)
+            logger.info(
+                f"✅ Stored {len(messages)} messages with Event ID: {result.get('eventId')} "
+                f"in {latency_ms:.0f} ms, queue depth {self._queue.qsize()}"
+            )
+            return
@@ -0,0 +1,65 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def process_age_ms() -> Optional[float]:
+    """Time since the process started, including interpreter and opentelemetry-instrument startup (Linux only)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name; the start time is field 22 of the full line.
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return round((uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")) * 1000, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile:
+    """Durations of the container's cold-start phases, logged once as "Startup profile: {json}".
+
+    mark() closes the phase that started at the previous mark (or when this
+    module was imported); phase() times a block. For a per-module breakdown
+    of the import phase run `python -X importtime -m agent`.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self._last_mark = self.started_at
+
+    def mark(self, name: str) -> None:
+        now = time.perf_counter()
+        self.phases[name] = round((now - self._last_mark) * 1000, 1)
+        self._last_mark = now
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - start) * 1000, 1)
+            self._last_mark = time.perf_counter()
+
+    def report(self) -> dict:
+        return {
+            "process_age_ms": process_age_ms(),
+            "since_agent_import_ms": round((time.perf_counter() - self.started_at) * 1000, 1),
+            "phases": dict(self.phases),
+        }
+
+    def log(self) -> dict:
+        report = self.report()
+        logger.info(f"Startup profile: {json.dumps(report)}")
+        return report
+
+
+# Started by the first import, which agent.py does before anything else.
+startup_profile = StartupProfile()
@@ -0,0 +1,165 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from strands.tools.mcp import MCPAgentTool
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the histogram buckets; anything slower lands in the last one.
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; percentiles are reported as bucket upper bounds."""
+
+    def __init__(self, buckets_ms=BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets_ms, duration_ms)] += 1
+        self.count += 1
+        self.sum_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.buckets_ms[i], self.max_ms) if i < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ms / self.count, 1) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class MetricsSink(ABC):
+    """Destination for phase durations; subclass to export them elsewhere."""
+
+    @abstractmethod
+    def record(self, phase: str, duration_ms: float) -> None:
+        ...
+
+
+class InMemorySink(MetricsSink):
+    """Keeps one Histogram per phase in process, e.g. for tests or local runs."""
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, duration_ms: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(phase)
+            if histogram is None:
+                histogram = self.histograms[phase] = Histogram()
+            histogram.observe(duration_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {phase: histogram.summary() for phase, histogram in sorted(self.histograms.items())}
+
+    def clear(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+
+
+class LoggingSink(InMemorySink):
+    """Aggregates like InMemorySink and logs the histograms as one JSON line per interval."""
+
+    def __init__(self, interval_seconds: float = 60):
+        super().__init__()
+        self.interval_seconds = interval_seconds
+        self._last_logged = time.monotonic()
+
+    def record(self, phase: str, duration_ms: float) -> None:
+        super().record(phase, duration_ms)
+        if time.monotonic() - self._last_logged >= self.interval_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_logged = time.monotonic()
+        snapshot = self.snapshot()
+        self.clear()
+        if snapshot:
+            logger.info(f"Phase latency: {json.dumps(snapshot)}")
+
+
+class RunTimings:
+    """Phase durations of one invocation, forwarded to a sink as they are recorded.
+
+    Phases that happen more than once in a run (tool calls) keep every duration.
+    """
+
+    def __init__(self, sink: Optional[MetricsSink] = None):
+        self.sink = sink
+        self.started_at = time.perf_counter()
+        self._phases: Dict[str, List[float]] = {}
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def record(self, phase: str, duration_ms: float) -> None:
+        self._phases.setdefault(phase, []).append(duration_ms)
+        if self.sink is not None:
+            try:
+                self.sink.record(phase, duration_ms)
+            except Exception as e:
+                logger.warning(f"Metrics sink failed to record {phase}: {e}")
+
+    @contextmanager
+    def span(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, (time.perf_counter() - start) * 1000)
+
+    def summary(self) -> dict:
+        """Compact {phase: ms} for the stream; repeated phases map to a list of ms."""
+        return {
+            phase: round(durations[0], 1) if len(durations) == 1 else [round(d, 1) for d in durations]
+            for phase, durations in self._phases.items()
+        }
+
+    def wrap_tools(self, tools: list) -> list:
+        """Time every MCP tool call as the phase "tool:<name>"."""
+        return [
+            MCPAgentTool(tool.mcp_tool, _TimedClient(tool.mcp_client, self)) if isinstance(tool, MCPAgentTool) else tool
+            for tool in tools
+        ]
+
+
+class _TimedClient:
+    """Stands in for an MCP client and records how long each tool call took."""
+
+    def __init__(self, client, timings: RunTimings):
+        self._client = client
+        self._timings = timings
+
+    async def call_tool_async(self, tool_use_id: str, name: str, *args, **kwargs):
+        with self._timings.span(f"tool:{name}"):
+            return await self._client.call_tool_async(tool_use_id, name, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
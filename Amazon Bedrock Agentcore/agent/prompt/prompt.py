@@ -0,0 +1,136 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+
+RECENT_CONVERSATION_HEADER = "### Recent conversation:"
+
+# Rough token estimate for budgeting; Claude tokenizers average ~4 characters per token.
+CHARS_PER_TOKEN = 4
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1500
+
+_SYSTEM_PROMPT_TEMPLATE = """You are a support expert.
+
+               Important behavioral rule:
+                - You have no internal or pretrained knowledge.
+                - You must only use the information provided by the tools you have access and the recent conversation.
+                - Treat your internal knowledge base as empty.
+                - Never use general world knowledge, assumptions, or reasoning beyond what is explicitly provided.
+                - Do not perform web searches or draw from any external sources.
+                - For maximum efficiency, whenever you need to perform multiple independent operations, invoke all relevant tools simultaneously rather than sequentially.
+
+               If the tools and recent conversation contain no relevant information, respond with:
+                - Simply say: “I don’t have that information in the provided context.”
+                - Do not mention or summarize what was found or not found in any search, tool output, or retrieved data.
+                - Never reference search results, documents, or tool outputs when explaining what you don’t know.
+
+               Answering rules:
+                - No Internal : NEVER include <thinking>, <reasoning>, or any XML-style tags in your response. Keep all reasoning internal.
+                - Use only information retrieved from tools or stated in the conversation.
+                - Do not include meta phrases like “based on the retrieved documents”, “according to the context”, ”Based on the search results”, “The search results“, ”Based on ...” or “the tool says.” Just give the answer directly.
+                - Always check if the answer already exists in the conversation before using tools.
+                - You may use multiple tools or call the same tool multiple times if necessary.
+                - Be concise (target ~500 words maximum).
+                - If unsure, admit uncertainty and ask the user to clarify or rephrase.
+
+               Follow-up query rule:
+                - End each answer with a single, concise follow-up question that helps deepen or extend the topic naturally.
+
+               Rephrasing rule for tool queries:
+                - If a <search_query> is given, use it as-is as the tool query.
+                - Otherwise, always rephrase the query to include relevant specifics (e.g., part, model, product, name) found in the recent conversation.
+                - If the query is already specific, use it as-is.
+                - Return only the rephrased query — no extra commentary.
+
+               Summary:
+                - Use only recent conversation and MCP tool results.
+                - No world knowledge.
+                - No assumptions.
+                - No web searches.
+                - Be concise, direct, and contextually grounded.
+
+               Available Tools
+                get_answer
+                - **Use for**: Direct factual questions, definitions, how-to queries
+                - **Returns**: Curated answer with citations from Coveo Answer API
+                - **Best for**: Single, focused questions with clear answers
+
+                get_passages
+                - **Use for**: Detailed explanations, comparisons, multi-step processes
+                - **Returns**: Relevant passages with full context and metadata
+                - **Best for**: Complex questions requiring synthesis from multiple sources
+
+                search
+                - **Use for**: Broad exploration, finding multiple resources
+                - **Returns**: Ranked search results with excerpts
+                - **Best for**: Open-ended or exploratory queries
+"""
+
+
+def compact(text: str) -> str:
+    """Strip source indentation and blank-line runs; the model does not need them, but pays for them."""
+    lines = [line.strip() for line in text.strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+SYSTEM_PROMPT = compact(_SYSTEM_PROMPT_TEMPLATE)
+
+Turn = List[Tuple[str, str]]
+
+
+class PromptAssembler:
+    """Builds the agent system prompt: a precomputed static prefix plus recent turns.
+
+    Conversation context is kept within context_token_budget by dropping the
+    oldest turns first (and cutting the newest one if it alone is too long).
+    Each turn is rendered once and reused across calls.
+    """
+
+    def __init__(self, prefix: str = SYSTEM_PROMPT, context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET, max_rendered_turns: int = 4096):
+        self.prefix = f"{prefix}\n\n{RECENT_CONVERSATION_HEADER}\n"
+        self.context_token_budget = context_token_budget
+        self.max_rendered_turns = max_rendered_turns
+        self._rendered: "OrderedDict[tuple, Tuple[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _render_turn(self, turn: Turn) -> Tuple[str, int]:
+        key = tuple(turn)
+        with self._lock:
+            rendered = self._rendered.get(key)
+            if rendered is not None:
+                self._rendered.move_to_end(key)
+                return rendered
+        text = "\n".join(f"{role}: {content}" for role, content in turn)
+        rendered = (text, estimate_tokens(text) + 1)
+        with self._lock:
+            self._rendered[key] = rendered
+            while len(self._rendered) > self.max_rendered_turns:
+                self._rendered.popitem(last=False)
+        return rendered
+
+    def render_context(self, turns: List[Turn]) -> str:
+        kept = []
+        used = 0
+        for turn in reversed(turns):
+            text, tokens = self._render_turn(turn)
+            if used + tokens > self.context_token_budget:
+                if not kept:
+                    # The newest turn alone is over budget: keep its beginning.
+                    kept.append(text[:self.context_token_budget * CHARS_PER_TOKEN] + "…")
+                break
+            kept.append(text)
+            used += tokens
+
+        omitted = len(turns) - len(kept)
+        if omitted:
+            kept.append(f"({omitted} earlier turns omitted)")
+        return "\n".join(reversed(kept))
+
+    def render(self, turns: List[Turn]) -> str:
+        if not turns:
+            return self.prefix
+        return self.prefix + self.render_context(turns)
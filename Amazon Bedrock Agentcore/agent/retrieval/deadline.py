@@ -0,0 +1,69 @@
+import logging
+import math
+import time
+from datetime import timedelta
+from typing import Optional
+
+from strands.tools.mcp import MCPAgentTool, MCPClient
+
+logger = logging.getLogger(__name__)
+
+# Used when the client does not send a deadline_ms, and as an upper bound when it does.
+DEFAULT_DEADLINE_SECONDS = 120
+
+
+class Deadline:
+    """Point in time by which the whole turn must be answered; same shape as the Coveo client's Deadline."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def after_ms(cls, milliseconds: float) -> "Deadline":
+        return cls(milliseconds / 1000)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def deadline_from_payload(payload: dict) -> Deadline:
+    """Deadline for a turn from the client's deadline_ms, capped at DEFAULT_DEADLINE_SECONDS.
+
+    A missing, non-numeric or non-positive deadline_ms gets the default instead.
+    """
+    deadline_ms = (payload or {}).get("deadline_ms")
+    if deadline_ms is None:
+        return Deadline(DEFAULT_DEADLINE_SECONDS)
+    try:
+        milliseconds = float(deadline_ms)
+    except (TypeError, ValueError):
+        milliseconds = math.nan
+    if not milliseconds > 0:
+        logger.warning(f"Ignoring invalid deadline_ms {deadline_ms!r}, using {DEFAULT_DEADLINE_SECONDS}s")
+        return Deadline(DEFAULT_DEADLINE_SECONDS)
+    return Deadline.after_ms(min(milliseconds, DEFAULT_DEADLINE_SECONDS * 1000))
+
+
+class DeadlineClient:
+    """Stands in for an MCPClient and caps every tool call at the time left."""
+
+    def __init__(self, client: MCPClient, deadline: Deadline):
+        self.client = client
+        self.deadline = deadline
+
+    async def call_tool_async(self, tool_use_id: str, name: str, arguments: Optional[dict] = None, read_timeout_seconds: Optional[timedelta] = None, *args, **kwargs):
+        remaining = timedelta(seconds=self.deadline.remaining())
+        if read_timeout_seconds is None or read_timeout_seconds > remaining:
+            read_timeout_seconds = remaining
+        return await self.client.call_tool_async(tool_use_id, name, arguments, read_timeout_seconds, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def with_deadline(tools: list, client: DeadlineClient) -> list:
+    return [MCPAgentTool(tool.mcp_tool, client) if isinstance(tool, MCPAgentTool) else tool for tool in tools]
@@ -0,0 +1,164 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+# Below this, the model rephrases the query itself (the prompt's rephrasing rule).
+DEFAULT_CONFIDENCE_THRESHOLD = 0.7
+
+# Words that point back at something named earlier in the conversation.
+_ANAPHORA = re.compile(r"\b(?:it|its|it's|they|them|their)\b|\b(?:this|that|these|those)\b(?!\s+\w)", re.IGNORECASE)
+# "Is that free?", "Does this work?": a demonstrative after a verb and before a final word is a pronoun too.
+_PREDICATE_DEMONSTRATIVE = re.compile(
+    r"\b(?:is|are|was|were|does|do|did|can|could|will|would|should)\s+(this|that|these|those)(?=\s+\w+\s*[?.!]*\s*$)",
+    re.IGNORECASE,
+)
+# "this error", "that page": a determiner, the query still lacks its product.
+_DETERMINER = re.compile(r"\b(this|that|these|those)\s+\w", re.IGNORECASE)
+# Follow-ups that only name what changed: "what about the X200?" swaps the subject,
+# "and on Windows?" qualifies the previous question.
+_SWAP = re.compile(r"^\s*(?:and\s+)?(?:what|how)\s+about\s+(?:the\s+)?(.+?)\s*\??\s*$", re.IGNORECASE)
+_QUALIFY = re.compile(r"^\s*and\s+((?:for|on|with|in|without)\s+.+?)\s*\??\s*$", re.IGNORECASE)
+_WORD = re.compile(r"[\w][\w.\-/+]*")
+# Model numbers, versions and product codes: anything mixing letters and digits (X200, v2.3, SM-G990).
+_CODE = re.compile(r"\b(?=[\w.\-/]*\d)(?=[\w.\-/]*[A-Za-z])[\w][\w.\-/]*\w\b")
+# Capitalized phrases (Coveo Relevance Generative Answering), with the model numbers
+# that follow them (Dell XPS 13 9310), and quoted names.
+_NAME = re.compile(r"\b[A-Z][\w\-]*(?:\s+(?:[A-Z][\w\-]*|\d[\w.\-]*|of|for|and))*|\"([^\"]+)\"|'([^']+)'")
+# Plural acronyms (APIs, SDKs); "they" and "them" can only point back at these.
+_PLURAL = re.compile(r"(?:^|\s)[A-Z0-9]{2,}s$")
+_PLURAL_PRONOUNS = frozenset(("they", "them", "their", "these", "those"))
+_STOPWORDS = frozenset(
+    "a an the i you we he she it they me my your our how what why when where which who can could do does did is are "
+    "was were be to of for in on at by with and or if then so this that these those there here please thanks thank "
+    "hi hello yes no ok okay also about".split()
+)
+# Rewrites with more than one possible subject, left to the model.
+_AMBIGUOUS_CONFIDENCE = 0.5
+# Guesses (the subject tacked onto the query) stay below the default threshold, so the model rephrases.
+_GUESS_CONFIDENCE = 0.6
+
+
+Turn = List[Tuple[str, str]]
+
+
+@dataclass(frozen=True)
+class Rewrite:
+    query: str
+    rewritten: bool
+    confidence: float
+    reason: str
+
+
+def extract_entities(text: str) -> List[str]:
+    """Product names, model numbers and quoted terms mentioned in text, in order."""
+    found = []
+    for match in _NAME.finditer(text):
+        name = (match.group(1) or match.group(2) or match.group(0)).strip()
+        words = name.split()
+        while words and words[0].lower() in _STOPWORDS:
+            words.pop(0)
+        while words and words[-1].lower() in _STOPWORDS:
+            words.pop()
+        # A single capitalized word is usually just the start of a sentence.
+        if len(words) > 1 or (words and (_CODE.fullmatch(words[0]) or words[0].isupper())):
+            found.append((match.start(), match.end(), " ".join(words)))
+    # Codes that are part of a name (the 13 of XPS 13) are not mentioned on their own.
+    for match in _CODE.finditer(text):
+        if not any(start <= match.start() and match.end() <= end for start, end, _ in found):
+            found.append((match.start(), match.end(), match.group(0)))
+    return [entity for _, _, entity in sorted(found)]
+
+
+def is_plural(entity: str) -> bool:
+    return bool(_PLURAL.search(entity))
+
+
+def _find_anaphora(query: str) -> Optional[Tuple[int, int, str]]:
+    """(start, end, pronoun) of the first word pointing back at an earlier subject."""
+    match = _ANAPHORA.search(query)
+    if match:
+        return match.start(), match.end(), match.group(0)
+    match = _PREDICATE_DEMONSTRATIVE.search(query)
+    if match:
+        return match.start(1), match.end(1), match.group(1)
+    return None
+
+
+def _content_words(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+class QueryRewriter:
+    """Folds the subject of recent turns into a follow-up query without an LLM call.
+
+    "Does it support SSO?" after a turn about "Coveo for Salesforce" becomes
+    "Does Coveo for Salesforce support SSO?". The rewrite comes with a
+    confidence; callers should let the model rephrase when it is low, i.e.
+    whenever more than one earlier subject could be meant. Pronouns resolve
+    to the most recent subject, in user or assistant messages, that agrees
+    with them in number.
+    """
+
+    def __init__(self, confidence_threshold: float = DEFAULT_CONFIDENCE_THRESHOLD):
+        self.confidence_threshold = confidence_threshold
+
+    def mentions(self, turns: List[Turn]) -> List[str]:
+        """Entities of the recent turns, user and assistant alike, most recently mentioned first."""
+        seen = {}
+        for position, entity in enumerate(e for turn in turns for _, text in turn for e in extract_entities(text)):
+            seen[entity] = position
+        return sorted(seen, key=seen.get, reverse=True)
+
+    def rewrite(self, query: str, turns: Optional[List[Turn]]) -> Rewrite:
+        swap, qualify, anaphora = _SWAP.match(query), _QUALIFY.match(query), _find_anaphora(query)
+        named = extract_entities(query)
+        content_words = len(_content_words(query))
+        if not (swap or qualify or anaphora):
+            if named or content_words >= 3 and not _DETERMINER.search(query):
+                return Rewrite(query, False, 1.0 if named else 0.9, "query is self-contained")
+            if not content_words:
+                return Rewrite(query, False, 0.9, "nothing to search for")
+
+        mentions = self.mentions(turns or [])
+        if not mentions:
+            return Rewrite(query, False, 0.3, "follow-up without a subject in recent turns")
+        # Acronyms (SSO, API) are usually features; a product name or model is a competing subject.
+        competing = any(" " in name or _CODE.fullmatch(name) for name in named)
+
+        if swap or qualify:
+            previous = self._last_user_query(turns)
+            if previous is None:
+                return Rewrite(query, False, 0.3, "follow-up without a previous question")
+            previous = previous.rstrip(" ?")
+            if qualify:
+                return Rewrite(f"{previous} {qualify.group(1)}", True, 0.9, "qualified the previous question")
+            subject = swap.group(1)
+            replaced = extract_entities(previous)
+            if extract_entities(subject) and replaced:
+                entity = replaced[-1]
+                confidence = 0.9 if len(set(replaced)) == 1 else _AMBIGUOUS_CONFIDENCE
+                return Rewrite(previous.replace(entity, subject), True, confidence, f"replaced {entity!r} with {subject!r}")
+            return Rewrite(f"{subject} {mentions[0]}", True, _GUESS_CONFIDENCE, f"asked about {subject!r} for {mentions[0]!r}")
+
+        if anaphora:
+            start, end, pronoun = anaphora
+            plural = pronoun.lower() in _PLURAL_PRONOUNS
+            agreeing = [entity for entity in mentions if is_plural(entity) == plural]
+            if not agreeing:
+                number = "plural" if plural else "singular"
+                return Rewrite(query, False, 0.3, f"no {number} subject in recent turns for {pronoun!r}")
+            entity = agreeing[0]
+            confidence = 0.9 if len(agreeing) == 1 and not competing else _AMBIGUOUS_CONFIDENCE
+            replacement = f"{entity}'s" if pronoun.lower() in ("its", "their") else entity
+            rewritten = query[:start] + replacement + query[end:]
+            return Rewrite(rewritten, True, confidence, f"resolved {pronoun!r} to {entity!r}")
+
+        return Rewrite(f"{query.rstrip(' ?')} {mentions[0]}", True, _GUESS_CONFIDENCE, f"added {mentions[0]!r} to the query")
+
+    @staticmethod
+    def _last_user_query(turns: Optional[List[Turn]]) -> Optional[str]:
+        for turn in reversed(turns or []):
+            for role, text in turn:
+                if role.upper() == "USER":
+                    return text
+        return None
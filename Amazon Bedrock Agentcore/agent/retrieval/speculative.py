@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from strands.tools.mcp import MCPAgentTool, MCPClient
+
+logger = logging.getLogger(__name__)
+
+# Retrieval tools worth starting before the model asks for them.
+SPECULATIVE_TOOLS = ("get_passages", "get_answer")
+# Minimum word overlap (Jaccard) between the speculative query and the model's query.
+DEFAULT_SIMILARITY_THRESHOLD = 0.6
+
+
+def query_terms(query: str) -> frozenset:
+    return frozenset(re.findall(r"\w+", query.lower()))
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class _Speculation:
+    query: str
+    terms: frozenset
+    task: asyncio.Task
+    started_at: float
+    finished_at: Optional[float] = None
+
+
+class SpeculativeRetrieval:
+    """Per-request cache of retrieval tool calls started as soon as the prompt arrives.
+
+    The calls run concurrently with the model's first planning step; when the
+    model then calls a speculated tool with a similar enough query, it gets
+    the speculative result without waiting for a new round trip.
+    """
+
+    def __init__(self, client: MCPClient, tool_names=SPECULATIVE_TOOLS, similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD):
+        self.client = client
+        self.tool_names = tuple(tool_names)
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._speculations: Dict[str, _Speculation] = {}
+
+    def start(self, query: str, tools: list) -> None:
+        available = {tool.tool_name for tool in tools}
+        for name in self.tool_names:
+            if name not in available or not query.strip():
+                continue
+            speculation = _Speculation(query=query, terms=query_terms(query), task=None, started_at=time.perf_counter())
+            speculation.task = asyncio.create_task(self._call(name, query, speculation))
+            # Unused speculations may fail quietly; take() reports failures of used ones.
+            speculation.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            self._speculations[name] = speculation
+
+    async def _call(self, name: str, query: str, speculation: _Speculation):
+        try:
+            return await self.client.call_tool_async(f"speculative-{uuid.uuid4().hex}", name, {"query": query})
+        finally:
+            speculation.finished_at = time.perf_counter()
+
+    async def take(self, name: str, arguments: dict) -> Optional[dict]:
+        """Return the speculative result for a matching tool call, or None on a miss."""
+        speculation = self._speculations.get(name)
+        if speculation is None:
+            return None
+
+        extra_arguments = set(arguments) - {"query"}
+        score = similarity(speculation.terms, query_terms(str(arguments.get("query", ""))))
+        if extra_arguments or score < self.similarity_threshold:
+            self.misses += 1
+            return None
+
+        asked_at = time.perf_counter()
+        try:
+            result = await speculation.task
+        except Exception as e:
+            logger.warning(f"Speculative {name} call failed, running it again: {e}")
+            self.misses += 1
+            return None
+        if result.get("status") != "success":
+            self.misses += 1
+            return None
+
+        # Time the model did not have to wait: however long the call had already been running.
+        self.hits += 1
+        self.saved_ms += (min(asked_at, speculation.finished_at) - speculation.started_at) * 1000
+        return result
+
+    def wrap(self, tools: list) -> list:
+        """Route the speculated MCP tools through this request's cache."""
+        proxy = _SpeculativeClient(self)
+        return [
+            MCPAgentTool(tool.mcp_tool, proxy) if isinstance(tool, MCPAgentTool) and tool.tool_name in self.tool_names else tool
+            for tool in tools
+        ]
+
+    def cancel(self) -> None:
+        for speculation in self._speculations.values():
+            if not speculation.task.done():
+                speculation.task.cancel()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "speculated": len(self._speculations),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_ms": round(self.saved_ms, 1),
+        }
+
+
+class _SpeculativeClient:
+    """Stands in for the pooled MCPClient; serves speculated results before calling it."""
+
+    def __init__(self, speculation: SpeculativeRetrieval):
+        self._speculation = speculation
+        self._client = speculation.client
+
+    async def call_tool_async(self, tool_use_id: str, name: str, arguments: Optional[dict] = None, *args, **kwargs):
+        result = await self._speculation.take(name, arguments or {})
+        if result is not None:
+            return {**result, "toolUseId": tool_use_id}
+        return await self._client.call_tool_async(tool_use_id, name, arguments, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict, deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Events kept per runtime session for clients that reconnect mid-answer.
+RESUME_BUFFER_SIZE = 512
+# How long a run keeps going after its client dropped, waiting for it to resume.
+RESUME_GRACE_SECONDS = 30
+
+# Marks the end of a run, so a client can tell a finished stream from a dropped one.
+END_EVENT = {"end": True}
+
+
+class EventLog:
+    """Ring buffer of the recent stream events of one runtime session.
+
+    Every event gets an id that keeps increasing across the runs of the
+    session and is embedded in the event JSON as "id". A client that lost
+    its connection sends the last id it saw and replay() continues from
+    there, tailing the run if it is still going, without invoking the model
+    again.
+    """
+
+    def __init__(self, maxlen: int = RESUME_BUFFER_SIZE, grace_seconds: float = RESUME_GRACE_SECONDS):
+        self.grace_seconds = grace_seconds
+        self._events = deque(maxlen=maxlen)
+        self._next_id = 1
+        self._changed = asyncio.Condition()
+        self._producer: Optional[asyncio.Task] = None
+        self._readers = 0
+        self._cancel_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def running(self) -> bool:
+        return self._producer is not None and not self._producer.done()
+
+    @property
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+    def begin_run(self, producer: asyncio.Task) -> None:
+        """Track a new run; a previous run of the same session is abandoned."""
+        if self.running:
+            logger.info("New prompt on a session with a run in progress, cancelling the previous run")
+            self._producer.cancel()
+        self._clear_cancel()
+        self._producer = producer
+        producer.add_done_callback(lambda _: asyncio.ensure_future(self._notify()))
+
+    async def append(self, obj: dict) -> str:
+        """Number and store an event, returning its JSON text."""
+        text = json.dumps({**obj, "id": self._next_id})
+        self._events.append((self._next_id, text))
+        self._next_id += 1
+        await self._notify()
+        return text
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._changed.notify_all()
+
+    def reader_attached(self) -> None:
+        self._readers += 1
+        self._clear_cancel()
+
+    def reader_detached(self) -> None:
+        """Give the client grace_seconds to resume before the run is cancelled."""
+        self._readers -= 1
+        if self._readers > 0 or not self.running:
+            return
+        self._clear_cancel()
+        self._cancel_handle = asyncio.get_running_loop().call_later(self.grace_seconds, self._cancel_unclaimed)
+
+    def _cancel_unclaimed(self) -> None:
+        self._cancel_handle = None
+        if self._readers == 0 and self.running:
+            logger.info("Client did not resume the stream, cancelling the run")
+            self._producer.cancel()
+
+    def _clear_cancel(self) -> None:
+        if self._cancel_handle is not None:
+            self._cancel_handle.cancel()
+            self._cancel_handle = None
+
+    async def replay(self, after_id: int):
+        """Yield the events after after_id, then follow the run until it ends."""
+        if after_id > self.last_id or (self._events and after_id < self._events[0][0] - 1):
+            yield json.dumps({"error": "The stream can no longer be resumed, please ask again.", "resumable": False})
+            return
+
+        self.reader_attached()
+        try:
+            cursor = after_id
+            while True:
+                if self._events and cursor < self._events[0][0] - 1:
+                    yield json.dumps({"error": "The client fell too far behind to resume.", "resumable": False})
+                    return
+                pending = [(event_id, text) for event_id, text in self._events if event_id > cursor]
+                for event_id, text in pending:
+                    yield text
+                    cursor = event_id
+                if not self.running and cursor >= self.last_id:
+                    return
+                async with self._changed:
+                    await self._changed.wait_for(lambda: self.last_id > cursor or not self.running)
+        finally:
+            self.reader_detached()
+
+
+class EventLogRegistry:
+    """Bounded, least recently used set of EventLog per runtime session id."""
+
+    def __init__(self, max_sessions: int = 1024, maxlen: int = RESUME_BUFFER_SIZE):
+        self.max_sessions = max_sessions
+        self.maxlen = maxlen
+        self._logs: "OrderedDict[str, EventLog]" = OrderedDict()
+
+    def get(self, session_id: str) -> EventLog:
+        log = self._logs.get(session_id)
+        if log is None:
+            log = self._logs[session_id] = EventLog(self.maxlen)
+        self._logs.move_to_end(session_id)
+        while len(self._logs) > self.max_sessions:
+            # Never drop the buffer of a live run.
+            idle = next((key for key, candidate in self._logs.items() if not candidate.running), None)
+            if idle is None:
+                break
+            del self._logs[idle]
+        return log
+
+    def find(self, session_id: str) -> Optional[EventLog]:
+        return self._logs.get(session_id)
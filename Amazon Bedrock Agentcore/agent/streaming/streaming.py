@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+from contextvars import ContextVar
+from typing import List, Optional
+
+from streaming.replay import END_EVENT, EventLog
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per invocation before producers block (backpressure).
+STREAM_BUFFER_SIZE = 256
+# Consecutive answer deltas are merged into one event until either limit is reached.
+COALESCE_WINDOW_SECONDS = 0.02
+COALESCE_MAX_BYTES = 256
+
+_FINISHED = object()
+
+
+class StreamingQueue:
+    """Bounded event channel between one agent run and its client stream.
+
+    put_* blocks while the buffer is full, so a slow client slows the agent
+    loop down instead of growing memory. When the client goes away the
+    producer task is cancelled and further puts are dropped.
+
+    With an EventLog, events are also numbered and kept for replay, and a
+    client that goes away gets the log's grace period to resume before the
+    producer is cancelled.
+
+    Answer deltas sent with put_answer are coalesced: the first one of a run
+    goes out at once, later ones are held for up to window_seconds or
+    max_bytes and sent as a single {"answer": ...} event. Any other event
+    flushes the held text first, so ordering is preserved.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = STREAM_BUFFER_SIZE,
+        log: Optional[EventLog] = None,
+        window_seconds: float = COALESCE_WINDOW_SECONDS,
+        max_bytes: int = COALESCE_MAX_BYTES,
+    ):
+        self._q = asyncio.Queue(maxsize=maxsize)
+        self._log = log
+        self._closed = False
+        self._finished = False
+        self._producer: Optional[asyncio.Task] = None
+        self.window_seconds = window_seconds
+        self.max_bytes = max_bytes
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._answer_started = False
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        # Serializes events from the producer and from the flush timer.
+        self._emit_lock = asyncio.Lock()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def attach(self, task: asyncio.Task) -> None:
+        """Bind the task producing this stream so it is cancelled on client disconnect."""
+        self._producer = task
+        if self._log is not None:
+            self._log.begin_run(task)
+
+    async def _put(self, item) -> None:
+        if self._closed or self._finished:
+            return
+        await self._q.put(item)
+
+    async def _emit(self, obj: dict) -> None:
+        async with self._emit_lock:
+            if self._log is None:
+                await self._put(json.dumps(obj))
+            elif not self._finished:
+                await self._put(await self._log.append(obj))
+
+    async def put_event(self, obj: dict):
+        await self.flush()
+        await self._emit(obj)
+
+    async def put_answer(self, text: str):
+        if self._finished or not text:
+            return
+        if not self._answer_started:
+            # Do not hold back the first token.
+            self._answer_started = True
+            await self._emit({"answer": text})
+            return
+        if not self._pending:
+            self._flush_timer = asyncio.get_running_loop().call_later(self.window_seconds, self._flush_soon)
+        self._pending.append(text)
+        self._pending_bytes += len(text.encode("utf-8"))
+        if self._pending_bytes >= self.max_bytes:
+            await self.flush()
+
+    def _flush_soon(self) -> None:
+        self._flush_timer = None
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self) -> None:
+        """Send the held answer text now."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending.clear()
+        self._pending_bytes = 0
+        await self._emit({"answer": text})
+
+    async def put_text(self, text: str):
+        await self._put(text)
+
+    async def finish(self):
+        if self._finished:
+            return
+        await self.flush()
+        if self._log is not None:
+            await self.put_event(END_EVENT)
+        self._finished = True
+        if not self._closed:
+            await self._q.put(_FINISHED)
+
+    async def stream(self):
+        if self._log is not None:
+            self._log.reader_attached()
+        try:
+            while True:
+                item = await self._q.get()
+                if item is _FINISHED:
+                    break
+                yield item
+        finally:
+            self._closed = True
+            if self._log is not None:
+                # Unblock a producer waiting on the full buffer; it keeps writing to the log only.
+                while not self._q.empty():
+                    self._q.get_nowait()
+                self._log.reader_detached()
+            elif self._producer is not None and not self._producer.done():
+                logger.info("Client stream closed before the run finished, cancelling it")
+                self._producer.cancel()
+
+
+# The queue of the invocation running in the current context; asyncio tasks
+# inherit it, so callbacks such as on_auth_url reach the right client.
+current_queue: ContextVar[Optional[StreamingQueue]] = ContextVar("current_queue", default=None)
@@ -0,0 +1,29 @@
+from typing import List
+
+from strands import Agent
+from strands.hooks import HookProvider
+from strands.models import Model
+from strands.models.bedrock import BedrockModel
+
+
+class AgentTemplate:
+    """The parts of the strands Agent that are the same for every session, built once per container.
+
+    A BedrockModel creates a boto3 client (~100 ms), so the template keeps
+    one model, which holds no per-request state, and the static system
+    prompt. create() then only assembles the session's tools, hooks and
+    state around them.
+    """
+
+    def __init__(self, system_prompt: str, model: Model = None):
+        self.system_prompt = system_prompt
+        self.model = model or BedrockModel()
+
+    def create(self, tools: list, hooks: List[HookProvider], state: dict) -> Agent:
+        return Agent(
+            model=self.model,
+            tools=tools,
+            hooks=hooks,
+            state=state,
+            system_prompt=self.system_prompt,
+        )
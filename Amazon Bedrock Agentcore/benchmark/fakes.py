@@ -0,0 +1,216 @@
+"""In-process stand-ins for the services the AgentCore agent depends on.
+
+AgentCore Memory, the 3LO token provider, the MCP server and the Bedrock
+model are replaced with fakes that sleep for configurable latencies, so
+agent.invoke can be driven by many concurrent sessions on one machine.
+Every fake derives its output from the session it serves (user id, token,
+memory turns), which lets the harness detect events that reach the wrong
+session.
+
+    fakes.install(agent_module, FakeConfig(model_first_token_ms=300))
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from mcp.types import Tool
+from strands.models.model import Model
+from strands.tools.mcp import MCPAgentTool
+
+WORDS = (
+    'the connector indexes every item of the source and refreshes its permissions on a schedule '
+    'that can be changed in the administration console under the source settings'
+).split()
+
+# The user id of the session being served; the fake token provider has no other way to know it.
+current_user: ContextVar[Optional[str]] = ContextVar('current_user', default=None)
+
+
+@dataclass
+class FakeConfig:
+    token_latency_ms: float = 50.0
+    mcp_connect_ms: float = 150.0
+    mcp_list_tools_ms: float = 30.0
+    tool_latency_ms: float = 250.0
+    memory_read_ms: float = 40.0
+    memory_write_ms: float = 40.0
+    model_first_token_ms: float = 400.0
+    delta_interval_ms: float = 15.0
+    answer_words: int = 120
+    words_per_delta: int = 2
+    jitter: float = 0.2
+
+
+def _delay(ms: float, jitter: float) -> float:
+    return max(0.0, ms * random.uniform(1 - jitter, 1 + jitter) / 1000)
+
+
+class FakeMemorySession(dict):
+    """Like MemorySession, a dict of its memoryId, actorId and sessionId."""
+
+    def __init__(self, store: 'FakeMemoryStore', actor_id: str, session_id: str):
+        super().__init__(memoryId='fake-memory', actorId=actor_id, sessionId=session_id)
+        self.store = store
+        self.actor_id = actor_id
+        self.session_id = session_id
+
+    def get_last_k_turns(self, k: int = 5) -> List[List[Dict[str, Any]]]:
+        time.sleep(_delay(self.store.config.memory_read_ms, self.store.config.jitter))
+        return self.store.last_turns((self.actor_id, self.session_id), k)
+
+    def add_turns(self, messages) -> Dict[str, str]:
+        time.sleep(_delay(self.store.config.memory_write_ms, self.store.config.jitter))
+        self.store.add((self.actor_id, self.session_id), [(m.role.value, m.text) for m in messages])
+        return {'eventId': uuid.uuid4().hex}
+
+
+class FakeMemoryStore:
+    """Conversation turns per (actor_id, session_id), shared by every FakeMemorySessionManager."""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self._turns: Dict[Tuple[str, str], List[List[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: Tuple[str, str], messages: List[Tuple[str, str]]) -> None:
+        with self._lock:
+            turns = self._turns.setdefault(key, [])
+            for role, text in messages:
+                message = {'role': role, 'content': {'text': text}}
+                if role == 'USER' or not turns:
+                    turns.append([message])
+                else:
+                    turns[-1].append(message)
+
+    def last_turns(self, key: Tuple[str, str], k: int) -> List[List[Dict[str, Any]]]:
+        with self._lock:
+            return [list(turn) for turn in self._turns.get(key, [])[-k:]]
+
+    def session_manager(self, memory_id: str = None, region_name: str = None, **kwargs) -> 'FakeMemorySessionManager':
+        return FakeMemorySessionManager(self)
+
+
+class FakeMemorySessionManager:
+    def __init__(self, store: FakeMemoryStore):
+        self.store = store
+
+    def create_memory_session(self, actor_id: str, session_id: str) -> FakeMemorySession:
+        return FakeMemorySession(self.store, actor_id, session_id)
+
+
+def fake_transport(url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> Tuple[str, Dict[str, str]]:
+    """Replaces streamable_http_transport; FakeMCPClient reads the url and token back from it."""
+    return url, headers or {}
+
+
+class FakeMCPClient:
+    """MCP server with get_passages and get_answer tools whose results name the token's user."""
+
+    TOOLS = (
+        ('get_passages', 'Retrieve passages relevant to the query from the Coveo index.'),
+        ('get_answer', 'Generate an answer to the query with the Coveo Answer API.'),
+    )
+
+    def __init__(self, transport_callable, config: FakeConfig):
+        self.transport_callable = transport_callable
+        self.config = config
+        self.user = None
+        self.calls = 0
+
+    def start(self) -> 'FakeMCPClient':
+        _, headers = self.transport_callable()
+        self.user = headers.get('Authorization', '').removeprefix('Bearer token-') or None
+        time.sleep(_delay(self.config.mcp_connect_ms, self.config.jitter))
+        return self
+
+    def stop(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+    def list_tools_sync(self, *args, **kwargs) -> List[MCPAgentTool]:
+        time.sleep(_delay(self.config.mcp_list_tools_ms, self.config.jitter))
+        schema = {'type': 'object', 'properties': {'query': {'type': 'string'}}, 'required': ['query']}
+        return [MCPAgentTool(Tool(name=name, description=description, inputSchema=schema), self) for name, description in self.TOOLS]
+
+    async def call_tool_async(self, tool_use_id: str, name: str, arguments: Optional[dict] = None, *args, **kwargs) -> dict:
+        self.calls += 1
+        await asyncio.sleep(_delay(self.config.tool_latency_ms, self.config.jitter))
+        query = (arguments or {}).get('query', '')
+        text = f'{name} result for {self.user}: passages about "{query}".'
+        return {'status': 'success', 'toolUseId': tool_use_id, 'content': [{'text': text}]}
+
+
+class ScriptedModel(Model):
+    """Streams a fixed conversation shape: one get_passages call, then a text answer.
+
+    The answer quotes the tool result and the session markers found in the
+    system prompt, so results or memory turns of another session show up
+    in the stream.
+    """
+
+    MARKER = re.compile(r'\b(?:user|session)-\d+\b')
+
+    def __init__(self, config: FakeConfig):
+        # Model reads self.config as the provider's config dict.
+        self.fake_config = config
+
+    def update_config(self, **model_config: Any) -> None:
+        pass
+
+    def get_config(self) -> Dict[str, Any]:
+        return {}
+
+    async def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        raise NotImplementedError('ScriptedModel does not produce structured output')
+        yield
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        last = messages[-1]['content']
+        tool_result = next((block['toolResult'] for block in last if 'toolResult' in block), None)
+        await asyncio.sleep(_delay(self.fake_config.model_first_token_ms, self.fake_config.jitter))
+        yield {'messageStart': {'role': 'assistant'}}
+
+        if tool_result is None and tool_specs:
+            text = next((block['text'] for block in last if 'text' in block), '')
+            match = re.search(r'<search_query>(.*?)</search_query>', text) or re.search(r'<query>(.*?)</query>', text)
+            tool_use = {'toolUseId': f'tooluse_{uuid.uuid4().hex[:12]}', 'name': 'get_passages'}
+            yield {'contentBlockStart': {'start': {'toolUse': tool_use}}}
+            yield {'contentBlockDelta': {'delta': {'toolUse': {'input': json.dumps({'query': match.group(1) if match else text})}}}}
+            yield {'contentBlockStop': {}}
+            yield {'messageStop': {'stopReason': 'tool_use'}}
+            return
+
+        result_text = ' '.join(block.get('text', '') for block in (tool_result or {}).get('content', []))
+        earlier = sorted(set(self.MARKER.findall(system_prompt or '')))
+        words = f'{result_text} Earlier in this conversation: {", ".join(earlier) or "nothing"}.'.split()
+        words += [WORDS[i % len(WORDS)] for i in range(self.fake_config.answer_words)]
+        for i in range(0, len(words), self.fake_config.words_per_delta):
+            if i:
+                await asyncio.sleep(_delay(self.fake_config.delta_interval_ms, self.fake_config.jitter))
+            yield {'contentBlockDelta': {'delta': {'text': ' '.join(words[i:i + self.fake_config.words_per_delta]) + ' '}}}
+        yield {'contentBlockStop': {}}
+        yield {'messageStop': {'stopReason': 'end_turn'}}
+
+
+def install(agent_module, config: FakeConfig) -> FakeMemoryStore:
+    """Point an imported agent module at the fakes; returns the fake memory store."""
+    import mcp_pool.mcp_pool as mcp_pool_module
+
+    async def need_token_3LO_async() -> str:
+        await asyncio.sleep(_delay(config.token_latency_ms, config.jitter))
+        return f'token-{current_user.get()}'
+
+    store = FakeMemoryStore(config)
+    agent_module.MemorySessionManager = store.session_manager
+    agent_module.need_token_3LO_async = need_token_3LO_async
+    agent_module.agent_template = agent_module.AgentTemplate(agent_module.build_system_prompt(), ScriptedModel(config))
+    mcp_pool_module.streamable_http_transport = fake_transport
+    mcp_pool_module.MCPClient = partial(FakeMCPClient, config=config)
+    return store
@@ -0,0 +1,188 @@
+"""Concurrent-session load test of the AgentCore entrypoint (agent.invoke).
+
+Runs N sessions at once in one process, each sending a few turns through
+agent.invoke and reading the stream like the runtime would. Memory, the
+3LO token provider, the MCP server and the model are the fakes in
+fakes.py, so only the agent's own code (queues, caches, hooks, strands)
+competes for the event loop. Reported per concurrency level:
+
+- time to first answer token and full turn latency, p50/p95/p99
+- event loop lag (how late a 10 ms timer fires), p50/p99/max
+- peak RSS of the process so far
+- sessions that received another session's events (should be 0)
+
+    python load_test.py --sessions 1,10,50,100 --turns 3
+    python load_test.py --sessions 200 --model-first-token-ms 800 --json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import re
+import resource
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import List
+
+import fakes
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+AGENT_DIR = os.path.join(os.path.dirname(HERE), 'agent')
+
+LAG_INTERVAL_SECONDS = 0.01
+MARKER = re.compile(r'\b(user|session)-(\d+)\b')
+PROMPTS = (
+    'How do I configure the Salesforce connector for session-{n}?',
+    'Does it support single sign-on?',
+    'What about the Sitecore connector?',
+    'How often are its permissions refreshed?',
+)
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+@dataclass
+class LevelStats:
+    ttft: List[float] = field(default_factory=list)
+    turn: List[float] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    leaks: List[str] = field(default_factory=list)
+
+
+def load_agent(config):
+    sys.path.insert(0, AGENT_DIR)
+    import agent
+    fakes.install(agent, config)
+    return agent
+
+
+async def monitor_lag(samples, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL_SECONDS)
+        samples.append(time.perf_counter() - start - LAG_INTERVAL_SECONDS)
+
+
+async def run_turn(agent, n, prompt, stats):
+    user_id, session_id = f'user-{n}', f'session-{n}'
+    fakes.current_user.set(user_id)
+    payload = {'prompt': prompt, 'user_id': user_id, 'mcp_url': 'https://mcp.example.com/mcp'}
+    context = agent.RequestContext(session_id=session_id)
+
+    start = time.perf_counter()
+    first = None
+    stream = await agent.invoke(payload, context)
+    async for text in stream:
+        event = json.loads(text)
+        if 'answer' in event and first is None:
+            first = time.perf_counter() - start
+        if 'error' in event:
+            stats.errors.append(f'{session_id}: {event["error"]}')
+        foreign = {match.group(0) for match in MARKER.finditer(text) if match.group(2) != str(n)}
+        if foreign:
+            stats.leaks.append(f'{session_id} received {", ".join(sorted(foreign))}: {text[:200]}')
+    stats.turn.append(time.perf_counter() - start)
+    if first is not None:
+        stats.ttft.append(first)
+
+
+async def run_session(agent, n, turns, think_seconds, stats):
+    for turn in range(turns):
+        await run_turn(agent, n, PROMPTS[turn % len(PROMPTS)].format(n=n), stats)
+        await asyncio.sleep(think_seconds)
+
+
+async def run_level(agent, sessions, first_session, turns, think_seconds):
+    stats, lag, stop = LevelStats(), [], asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(lag, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_session(agent, first_session + i, turns, think_seconds, stats) for i in range(sessions)
+    ))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    def ms(values, p):
+        value = percentile(values, p)
+        return None if value is None else round(value * 1000, 1)
+
+    return {
+        'sessions': sessions,
+        'turns': len(stats.turn),
+        'elapsed_s': round(elapsed, 2),
+        'turns_per_s': round(len(stats.turn) / elapsed, 1) if elapsed else None,
+        'ttft_ms': {f'p{p}': ms(stats.ttft, p) for p in (50, 95, 99)},
+        'turn_ms': {f'p{p}': ms(stats.turn, p) for p in (50, 95, 99)},
+        'loop_lag_ms': {'p50': ms(lag, 50), 'p99': ms(lag, 99), 'max': round(max(lag, default=0) * 1000, 1)},
+        'peak_rss_mib': peak_rss_mib(),
+        'errors': len(stats.errors),
+        'leaks': len(stats.leaks),
+        'error_samples': stats.errors[:5],
+        'leak_samples': stats.leaks[:5],
+    }
+
+
+def print_report(result):
+    print(f"\n== {result['sessions']} concurrent sessions, {result['turns']} turns in {result['elapsed_s']}s ({result['turns_per_s']} turns/s) ==")
+    print('time to 1st token  p50 {p50} ms  p95 {p95} ms  p99 {p99} ms'.format(**result['ttft_ms']))
+    print('turn latency       p50 {p50} ms  p95 {p95} ms  p99 {p99} ms'.format(**result['turn_ms']))
+    print('event loop lag     p50 {p50} ms  p99 {p99} ms  max {max} ms'.format(**result['loop_lag_ms']))
+    print(f"peak RSS           {result['peak_rss_mib']} MiB")
+    print(f"errors             {result['errors']}")
+    for sample in result['error_samples']:
+        print(f'  {sample}')
+    print(f"cross-session      {result['leaks']}" + ('  <-- events reached the wrong session' if result['leaks'] else ''))
+    for sample in result['leak_samples']:
+        print(f'  {sample}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', default='1,10,50', help='comma separated concurrency levels, run one after the other')
+    parser.add_argument('--turns', type=int, default=2, help='turns per session')
+    parser.add_argument('--think-ms', type=float, default=0, help='pause between the turns of a session')
+    parser.add_argument('--json', action='store_true', help='print one JSON object per level instead of a table')
+    parser.add_argument('--verbose', action='store_true', help='keep the agent logs')
+    defaults = fakes.FakeConfig()
+    for name, value in vars(defaults).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    config = fakes.FakeConfig(**{name: getattr(args, name) for name in vars(defaults)})
+    if not args.verbose:
+        logging.disable(logging.ERROR)
+    agent = load_agent(config)
+
+    async def run():
+        first_session = 0
+        for sessions in (int(level) for level in args.sessions.split(',')):
+            # Each level uses new sessions, so the first turn of every session reads memory and connects to MCP.
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                result = await run_level(agent, sessions, first_session, args.turns, args.think_ms / 1000)
+            first_session += sessions
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print_report(result)
+        agent.memory_writer.close()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,15 @@
 import json
+import re
 import urllib
 import uuid
 from typing import Optional
 import requests
+from requests.adapters import HTTPAdapter
 import boto3
 import streamlit as st
 import logging
+import threading
+import time
 from datetime import datetime
 
 # ----------------------
@@ -98,88 +102,220 @@ def log_status(message: str, level: str = "info"):
 # ----------------------
 # Auth helper
 # ----------------------
-def generate_auth_header() -> str:
-    # Prefer Streamlit secrets; fallback to env vars
-    client_id = default_client_id
-    username = default_user_id
-    password = default_user_pwd
+# Refresh the Cognito access token this long before it expires.
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+
+@st.cache_resource
+def get_cognito_client():
+    return boto3.client("cognito-idp", region_name=default_region)
+
+@st.cache_resource
+def get_token_cache() -> dict:
+    """Process-wide token cache, shared across Streamlit reruns: {username: tokens}."""
+    return {"lock": threading.Lock(), "tokens": {}}
+
+def _authenticate(client, client_id: str, username: str, password: str, refresh_token: Optional[str]) -> dict:
+    if refresh_token:
+        try:
+            resp = client.initiate_auth(
+                ClientId=client_id,
+                AuthFlow="REFRESH_TOKEN_AUTH",
+                AuthParameters={"REFRESH_TOKEN": refresh_token},
+            )
+            return resp["AuthenticationResult"]
+        except client.exceptions.NotAuthorizedException:
+            logger.info("Refresh token rejected, signing in again")
 
-    client = boto3.client("cognito-idp", region_name=default_region)
     resp = client.initiate_auth(
         ClientId=client_id,
         AuthFlow="USER_PASSWORD_AUTH",
         AuthParameters={"USERNAME": username, "PASSWORD": password},
     )
-    return resp["AuthenticationResult"]["AccessToken"]
+    return resp["AuthenticationResult"]
+
+def generate_auth_header() -> str:
+    # Prefer Streamlit secrets; fallback to env vars
+    client_id = default_client_id
+    username = default_user_id
+    password = default_user_pwd
+
+    cache = get_token_cache()
+    with cache["lock"]:
+        cached = cache["tokens"].get(username)
+        if cached and cached["expires_at"] - TOKEN_REFRESH_MARGIN_SECONDS > time.time():
+            return cached["access_token"]
+
+        result = _authenticate(
+            get_cognito_client(), client_id, username, password,
+            cached.get("refresh_token") if cached else None,
+        )
+        cache["tokens"][username] = {
+            "access_token": result["AccessToken"],
+            "expires_at": time.time() + result["ExpiresIn"],
+            # The refresh flow does not return a new refresh token; keep the current one.
+            "refresh_token": result.get("RefreshToken") or (cached or {}).get("refresh_token"),
+        }
+        return result["AccessToken"]
 
 # ----------------------
 # Agent invocation
 # ----------------------
+# The agent must finish a turn within this deadline; it is sent along so the
+# runtime can bound every downstream call by the time that is left.
+REQUEST_DEADLINE_SECONDS = 120
+CONNECT_TIMEOUT_SECONDS = 10
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Keep-alive session shared across prompts and reruns, so each turn skips the TLS handshake."""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=8))
+    return session
+
+# A dropped stream is resumed from the last event id this many times.
+MAX_RESUME_ATTEMPTS = 3
+LAST_EVENT_ID_HEADER = "X-Amzn-Bedrock-AgentCore-Runtime-Custom-Last-Event-Id"
+
+def _stream_events(url: str, headers: dict, body: dict):
+    with get_http_session().post(
+        url,
+        params={"qualifier": default_qualifier},
+        headers=headers,
+        json=body,
+        # Read timeout is per chunk; the agent enforces the overall deadline.
+        timeout=(CONNECT_TIMEOUT_SECONDS, REQUEST_DEADLINE_SECONDS),
+        stream=True,
+    ) as response:
+        response.raise_for_status()
+        ctype = (response.headers.get("Content-Type") or "").lower()
+
+        if "text/event-stream" in ctype:
+            for raw in response.iter_lines(decode_unicode=True):
+                if not raw:
+                    continue
+                if raw.startswith(":"):
+                    continue
+                if raw.startswith("data:"):
+                    payload = raw[5:].strip()
+                    if not payload:
+                        continue
+                    if payload == "[DONE]":
+                        break
+                    try:
+                        event = json.loads(payload)
+                    except Exception:
+                        yield {"text": payload}
+                        continue
+                    # The agent yields JSON strings, which the runtime encodes once more.
+                    if isinstance(event, str):
+                        try:
+                            event = json.loads(event)
+                        except Exception:
+                            pass
+                    yield event
+            return
+
+        # Non-SSE fallback
+        try:
+            yield response.json()
+        except Exception:
+            yield {"text": response.text}
+
 def send_query(prompt: str):
+    """Yield the agent's events, resuming after the last event id if the stream drops."""
     logger.info(f"User input: {prompt}")
 
-    bearer_token = generate_auth_header()
-
     escaped_arn = urllib.parse.quote(
         f"arn:aws:bedrock-agentcore:{default_region}:381491957401:runtime/{default_agent}",
         safe="",
     )
     url = f"https://bedrock-agentcore.{default_region}.amazonaws.com/runtimes/{escaped_arn}/invocations"
 
-    headers = {
-        "Authorization": f"Bearer {bearer_token}",
-        "Accept": "text/event-stream",
-        "Content-Type": "application/json",
-        "X-Amzn-Bedrock-AgentCore-Runtime-Session-Id": st.session_state.runtime_session_id,
-        "X-Amzn-Bedrock-AgentCore-Runtime-User-Id": default_runtime_user_id,
-    }
-
     body = {
         "prompt": prompt,
         "mcp_url": mcp_url,
         "user_id": default_user_id,
         "session_id": st.session_state.runtime_session_id,
+        "deadline_ms": REQUEST_DEADLINE_SECONDS * 1000,
     }
 
-    try:
-        with requests.post(
-            url,
-            params={"qualifier": default_qualifier},
-            headers=headers,
-            json=body,
-            timeout=None,
-            stream=True,
-        ) as response:
-            response.raise_for_status()
-            ctype = (response.headers.get("Content-Type") or "").lower()
-
-            if "text/event-stream" in ctype:
-                for raw in response.iter_lines(decode_unicode=True):
-                    if not raw:
-                        continue
-                    if raw.startswith(":"):
-                        continue
-                    if raw.startswith("data:"):
-                        payload = raw[5:].strip()
-                        if not payload:
-                            continue
-                        if payload == "[DONE]":
-                            break
-                        try:
-                            yield json.loads(payload)
-                        except Exception:
-                            yield {"text": payload}
-                return
+    last_event_id = None
+    for attempt in range(MAX_RESUME_ATTEMPTS + 1):
+        headers = {
+            "Authorization": f"Bearer {generate_auth_header()}",
+            "Accept": "text/event-stream",
+            "Content-Type": "application/json",
+            "X-Amzn-Bedrock-AgentCore-Runtime-Session-Id": st.session_state.runtime_session_id,
+            "X-Amzn-Bedrock-AgentCore-Runtime-User-Id": default_runtime_user_id,
+        }
+        if last_event_id is not None:
+            headers[LAST_EVENT_ID_HEADER] = str(last_event_id)
+            body["last_event_id"] = last_event_id
 
-            # Non-SSE fallback
-            try:
-                yield response.json()
-            except Exception:
-                yield {"text": response.text}
+        try:
+            for event in _stream_events(url, headers, body):
+                if isinstance(event, dict) and event.get("resumable") is False:
+                    # The agent no longer has the events after last_event_id; retrying cannot help.
+                    yield event
+                    return
+                if isinstance(event, dict) and "id" in event:
+                    last_event_id = event["id"]
+                    if event.get("end"):
+                        return
+                yield event
+            if last_event_id is None:
+                # Events without ids: the agent does not support resuming.
+                return
+            logger.warning("Stream ended before the run finished, resuming after event %s", last_event_id)
+        except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError) as e:
+            if last_event_id is None:
+                logger.error("Failed to invoke agent endpoint: %s", str(e))
+                raise
+            logger.warning("Stream dropped (%s), resuming after event %s", e, last_event_id)
+        except requests.exceptions.RequestException as e:
+            logger.error("Failed to invoke agent endpoint: %s", str(e))
+            raise
+
+    yield {"error": f"The stream dropped {MAX_RESUME_ATTEMPTS + 1} times, giving up."}
 
-    except requests.exceptions.RequestException as e:
-        logger.error("Failed to invoke agent endpoint: %s", str(e))
-        raise
+# ----------------------
+# Answer rendering
+# ----------------------
+# Streamed tokens are pushed to the page at most this often.
+FLUSH_INTERVAL_SECONDS = 0.05
+
+_FENCE = re.compile(r"^ {0,3}(?:```|~~~)", re.MULTILINE)
+# A list item, or a line indented as the continuation of one.
+_LIST_LINE = re.compile(r"^(?: {0,3}(?:[-*+]|\d+[.)])(?:\s|$)| {2,}|\t)")
+
+def _list_open(before: str, after: str) -> bool:
+    """Whether a list runs up to this paragraph break and may continue after it.
+
+    A loose list separates its items with blank lines, and each markdown
+    element renders its own list, so freezing inside one restarts the
+    numbering. The list is closed once a complete line that is not part of
+    it follows the break.
+    """
+    last_block = before.rsplit("\n\n", 1)[-1]
+    if not _LIST_LINE.match(last_block):
+        return False
+    if "\n" not in after:
+        return True
+    return bool(_LIST_LINE.match(after))
+
+def split_settled(text: str):
+    """Split text at its last paragraph break outside a code fence or list: (settled, tail).
+
+    Settled paragraphs are rendered once and never touched again, so each
+    flush only re-renders the blocks that may still change.
+    """
+    idx = text.rfind("\n\n")
+    while idx > 0:
+        before, after = text[:idx], text[idx + 2:]
+        if len(_FENCE.findall(before)) % 2 == 0 and not _list_open(before, after):
+            return text[:idx + 2], after
+        idx = text.rfind("\n\n", 0, idx)
+    return "", text
 
 # ----------------------
 # UI
@@ -199,18 +335,24 @@ if prompt:
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        # Collapsible status panel (use a placeholder so we REPLACE, not append)
+        # Collapsible status panel; each status line is its own element, so new
+        # lines are appended without re-sending the ones already shown.
         expander = st.expander("Run status (click to expand)", expanded=False)
         log_placeholder = expander.empty()
+        rendered_log = 0
 
         def render_log():
+            global rendered_log
             ICON = {"info": "ℹ️", "warn": "⚠️", "error": "❌"}
-            if not st.session_state.status_log:
+            log = st.session_state.status_log
+            if not log:
                 log_placeholder.markdown("_No status yet…_")
                 return
-            md = "\n".join(f"- {ICON.get(level,'•')} {msg}"
-                           for level, msg in st.session_state.status_log)
-            log_placeholder.markdown(md)
+            if rendered_log == 0:
+                log_placeholder.empty()
+            for level, msg in log[rendered_log:]:
+                expander.markdown(f"- {ICON.get(level,'•')} {msg}")
+            rendered_log = len(log)
 
         # Start a brand-new status area for THIS run only
         _reset_status_state()
@@ -220,15 +362,36 @@ if prompt:
         loading = st.empty()
         loading.markdown("⏳ Generating answer…")
 
-        # Where streamed assistant text goes
-        placeholder = st.empty()
-        streamed_text = ""
+        # Where streamed assistant text goes: finished paragraphs stay in their own
+        # elements and only the paragraph being written is re-rendered.
+        answer_area = st.container()
+        placeholder = answer_area.empty()
+        answer_parts = []
+        tail = ""
         buffer = ""
-        FLUSH_AT = 32
+        last_flush = time.monotonic()
+
+        def flush():
+            global placeholder, tail, buffer, last_flush
+            tail += buffer
+            buffer = ""
+            last_flush = time.monotonic()
+            settled, tail = split_settled(tail)
+            if settled:
+                placeholder.markdown(settled)
+                answer_parts.append(settled)
+                placeholder = answer_area.empty()
+            if tail:
+                placeholder.markdown(tail)
 
         try:
             for event in send_query(prompt):
                 logging.info(event)
+                # The page can only be redrawn when an event arrives, so tokens buffered
+                # right before a pause (e.g. a tool call) are shown with the next event of
+                # any kind, and the last ones when the stream ends.
+                if buffer and time.monotonic() - last_flush >= FLUSH_INTERVAL_SECONDS:
+                    flush()
 
                 # Normalize event into dict/str
                 data = event
@@ -240,7 +403,7 @@ if prompt:
 
                 # Handle auth URL
                 if isinstance(data, dict) and "auth_url" in data:
-                    placeholder.markdown(f"[Click to authorize]({data['auth_url']})")
+                    answer_area.markdown(f"[Click to authorize]({data['auth_url']})")
                     continue
 
                 # Handle explicit errors
@@ -249,6 +412,13 @@ if prompt:
                     render_log()
                     continue
 
+                # Per-phase latency summary sent at the end of the run
+                if isinstance(data, dict) and "timings" in data:
+                    phases = ", ".join(f"{k} {v} ms" for k, v in data["timings"].items())
+                    log_status(f"timings: {phases}", "info")
+                    render_log()
+                    continue
+
                 # Structured status updates
                 if isinstance(data, dict) and "status" in data:
                     s = str(data["status"])
@@ -281,12 +451,10 @@ if prompt:
                 if token is None:
                     continue
 
-                # Buffered flush for smoother UI
+                # Time-based flush: cost per token stays constant at any token rate
                 buffer += token
-                if len(buffer) >= FLUSH_AT or buffer.endswith((" ", "\n")):
-                    streamed_text += buffer
-                    buffer = ""
-                    placeholder.markdown(streamed_text)
+                if time.monotonic() - last_flush >= FLUSH_INTERVAL_SECONDS:
+                    flush()
 
         except Exception as e:
             log_status(f"Invocation failed: {e}", "error")
@@ -294,11 +462,11 @@ if prompt:
             st.error(f"Invocation failed: {e}")
         finally:
             if buffer:
-                streamed_text += buffer
-                placeholder.markdown(streamed_text)
+                flush()
+            answer_parts.append(tail)
 
             loading.markdown("✅ Finished")
-            st.session_state.messages.append({"role": "assistant", "content": streamed_text})
+            st.session_state.messages.append({"role": "assistant", "content": "".join(answer_parts)})
 
 # Controls
 ctrl_col1, ctrl_col2, ctrl_col3 = st.columns([1, 1, 2])
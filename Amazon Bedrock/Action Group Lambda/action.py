@@ -1,31 +1,199 @@
 import json
 import http.client
+import os
+import random
+import select
+import socket
 import urllib.parse
 import time
 
+from passage_cache import PassageCache, make_key
+from passage_packing import pack_passages
+
+# Container-scope configuration, read once per cold start.
+ORG_ID = os.environ.get("COVEO_ORG_ID", "[org_id]")
+SEARCH_TOKEN = os.environ.get("COVEO_API_KEY", "[api_key]")
+SEARCH_HUB = os.environ.get("COVEO_SEARCH_HUB", "[searchHub]")
+SERVER = os.environ.get("COVEO_SERVER", f"{ORG_ID}.org.coveo.com")
+# Plain HTTP is only meant for local stub servers (see Coveo/benchmark).
+CONNECTION_CLASS = http.client.HTTPConnection if os.environ.get("COVEO_PLAIN_HTTP") == "1" else http.client.HTTPSConnection
+# Reconnect proactively when the connection sat idle longer than the server keep-alive.
+CONNECTION_MAX_IDLE_SECONDS = float(os.environ.get("COVEO_CONNECTION_MAX_IDLE_SECONDS", "50"))
+CONNECTION_TIMEOUT_SECONDS = float(os.environ.get("COVEO_CONNECTION_TIMEOUT_SECONDS", "10"))
+# Passages are deduplicated, merged per document and packed into this many tokens.
+PASSAGE_TOKEN_BUDGET = int(os.environ.get("COVEO_PASSAGE_TOKEN_BUDGET", "1000"))
+# Passage fields returned to the agent, and the cap on the encoded responseBody.
+RESPONSE_FIELDS = tuple(f.strip() for f in os.environ.get("COVEO_RESPONSE_FIELDS", "text,title,clickableuri,score").split(",") if f.strip())
+RESPONSE_MAX_BYTES = int(os.environ.get("COVEO_RESPONSE_MAX_BYTES", "8000"))
+# Fraction of invocations that log the full event and every passage.
+LOG_SAMPLE_RATE = float(os.environ.get("COVEO_LOG_SAMPLE_RATE", "0.01"))
+
+HEADERS = {
+    'Content-Type': 'application/json',
+    'Authorization': f'Bearer {SEARCH_TOKEN}'
+}
+
+# Lives for the lifetime of the warm container, so repeat questions skip the network.
+passage_cache = PassageCache()
+
+_connection = None
+_connection_last_used = 0.0
+
+def _connection_is_healthy(connection):
+    """An idle keep-alive socket that is readable has been closed by the server."""
+    if connection.sock is None:
+        return False
+    if time.monotonic() - _connection_last_used > CONNECTION_MAX_IDLE_SECONDS:
+        return False
+    try:
+        readable, _, _ = select.select([connection.sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+def _close_connection():
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+def get_connection(timings):
+    """Return the container's connection, reconnecting when it is missing or stale."""
+    global _connection
+    if _connection is not None and _connection_is_healthy(_connection):
+        timings["connection_reused"] = True
+        return _connection
+
+    _close_connection()
+    start = time.perf_counter()
+    _connection = CONNECTION_CLASS(SERVER, timeout=CONNECTION_TIMEOUT_SECONDS)
+    _connection.connect()
+    # Headers and body go out as separate writes; don't let Nagle hold the body back.
+    _connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    timings["connect_ms"] = (time.perf_counter() - start) * 1000
+    timings["connection_reused"] = False
+    return _connection
+
+def post_passages(api_url, json_body, timings):
+    """POST over the persistent connection, retrying once on a fresh connection if it was dropped."""
+    global _connection_last_used
+    for attempt in range(2):
+        connection = get_connection(timings)
+        try:
+            start = time.perf_counter()
+            connection.request("POST", api_url, body=json_body, headers=HEADERS)
+            response = connection.getresponse()
+            timings["first_byte_ms"] = (time.perf_counter() - start) * 1000
+            response_body = response.read().decode('utf-8')
+            timings["request_ms"] = (time.perf_counter() - start) * 1000
+        except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionError, BrokenPipeError):
+            _close_connection()
+            if attempt == 1 or not timings["connection_reused"]:
+                raise
+            continue
+        except Exception:
+            _close_connection()
+            raise
+
+        if response.will_close:
+            _close_connection()
+        _connection_last_used = time.monotonic()
+        return response, response_body
+
+def project_item(item):
+    """Flatten a PRAPI item to the configured fields."""
+    document = item.get('document') or {}
+    values = {
+        'text': item.get('text', ''),
+        'title': document.get('title'),
+        'clickableuri': document.get('clickableuri'),
+        'score': item.get('relevanceScore'),
+        'primaryid': document.get('primaryid'),
+    }
+    return {field: values.get(field, document.get(field)) for field in RESPONSE_FIELDS}
+
+def _encoded_size(value):
+    return len(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+def compact_items(items, max_bytes=RESPONSE_MAX_BYTES):
+    """Project items and keep them, best first, until the encoded list reaches max_bytes.
+
+    The item that crosses the cap is cut at a word boundary instead of dropped.
+    """
+    compacted, size = [], 2
+    for item in map(project_item, items):
+        item_size = _encoded_size(item) + 1
+        if size + item_size <= max_bytes:
+            compacted.append(item)
+            size += item_size
+            continue
+        # Escaped characters (non-ASCII, quotes, newlines) encode to more than one byte,
+        # so the longest text that fits is searched with the same encoder.
+        text = item.get('text') or ''
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if size + _encoded_size({**item, 'text': text[:middle]}) + 1 <= max_bytes:
+                low = middle
+            else:
+                high = middle - 1
+        if low:
+            cut = text[:low]
+            compacted.append({**item, 'text': cut.rsplit(' ', 1)[0] if ' ' in cut else cut})
+        break
+    return compacted
+
+def build_action_response(event, status, response_data):
+    if 'requestBody' in event:
+        action_response = {
+            "actionGroup": event["actionGroup"],
+            "apiPath": event["apiPath"],
+            "httpMethod": event["httpMethod"],
+            "parameters": event["parameters"],
+            "httpStatusCode": status,
+            "responseBody": response_data,
+        }
+
+        session_attributes = event.get("sessionAttributes", {})
+        prompt_session_attributes = event.get("promptSessionAttributes", {})
+
+        return {
+            "messageVersion": "1.0",
+            "response": action_response,
+            "sessionAttributes": session_attributes,
+            "promptSessionAttributes": prompt_session_attributes,
+        }
+    else:
+        return "\n\n".join(item.get('text', '') for item in response_data)
+
+def respond(event, status, items, sampled):
+    """Pack, project and cap the raw PRAPI items, logging how much was cut."""
+    response_data = compact_items(pack_passages(items, PASSAGE_TOKEN_BUDGET))
+    print(f"Response size: {len(items)} -> {len(response_data)} passages, "
+          f"{_encoded_size(items)} -> {_encoded_size(response_data)} bytes")
+    if sampled:
+        for ind, data in enumerate(response_data, start=1):
+            print(f"Chunk #{ind} : {data}")
+    return build_action_response(event, status, response_data)
+
 def lambda_handler(event, context):
+    sampled = random.random() < LOG_SAMPLE_RATE
+    if sampled:
+        print(event)
+        print(context)
+
+    start = time.perf_counter()
+    timings = {"connect_ms": 0.0, "connection_reused": None}
 
-    print(event)
-    print(context)
-    
     apiPath = event["apiPath"]
-    org_id = "[org_id]"
-    server = f"{org_id}.org.coveo.com"
-    search_token = "[api_key]"
     query = event["inputText"]
-    searchHub = "[searchHub]"
 
     #if you want to use the repharse query from bedrock
     #for prop in event['requestBody']['content']['application/json']['properties']:
     #    if prop['name'] == 'query':
     #        query = prop['value']
-    
-    api_url = f"{apiPath}?organizationId={org_id}"
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {search_token}'
-    }
+
+    api_url = f"{apiPath}?organizationId={ORG_ID}"
 
     request_body = {
         'localization':  {
@@ -34,60 +202,37 @@ def lambda_handler(event, context):
         },
         'query': query,
         'additionalFields' : ['clickableuri'],
-        'searchHub': searchHub, 
+        'searchHub': SEARCH_HUB,
         'maxPassages': 5
     }
 
+    # Set the session attribute bypassPassageCache to "true" to always query Coveo.
+    use_cache = str(event.get("sessionAttributes", {}).get("bypassPassageCache", "")).lower() != "true"
+    cache_key = make_key(query, SEARCH_HUB, request_body['localization']['locale'], request_body['maxPassages'], ORG_ID, SEARCH_TOKEN)
+    if use_cache:
+        response_data = passage_cache.get(cache_key)
+        if response_data is not None:
+            print(f"Passage cache hit: {passage_cache.stats()}")
+            return respond(event, 200, response_data, sampled)
+
     json_body = json.dumps(request_body)
 
     try:
-        # Create an HTTP connection
-        connection = http.client.HTTPSConnection(server)
-        print("connection",connection)
-        
-        # Send POST request
-        connection.request("POST", api_url, body=json_body, headers=headers)
-
-        # Get response
-        response = connection.getresponse()
-        response_body = response.read().decode('utf-8')
-        
+        response, response_body = post_passages(api_url, json_body, timings)
+
         print(f'HTTP Response Status: {response.status}, Reason: {response.reason}')
-        
+
         if response.status >= 200 and response.status < 300:
             response_data = json.loads(response_body)['items']
-            
-            for ind, data in enumerate(response_data,start=1):
-                print(f"Chunk #{ind} : {data}")
-            
-            if 'requestBody' in event:
-                action_response = {
-                    "actionGroup": event["actionGroup"],
-                    "apiPath": event["apiPath"],
-                    "httpMethod": event["httpMethod"],
-                    "parameters": event["parameters"],
-                    "httpStatusCode": response.status,
-                    "responseBody": response_data,
-                }
-
-                session_attributes = event.get("sessionAttributes", {})
-                prompt_session_attributes = event.get("promptSessionAttributes", {})
-
-                return {
-                    "messageVersion": "1.0",
-                    "response": action_response,
-                    "sessionAttributes": session_attributes,
-                    "promptSessionAttributes": prompt_session_attributes,
-                }
-            else:
-                strResult = ", ".join(item['text'] for item in response_data)
-                return strResult
+            passage_cache.put(cache_key, response_data)
+            return respond(event, response.status, response_data, sampled)
         else:
             raise Exception(f'Failed to send request to Coveo API: {response.status}, {response.reason}')
-    
+
     except Exception as e:
         print(f'Exception occurred during HTTP callout: {str(e)}')
         raise Exception(f'Failed to send request to Coveo API: {str(e)}')
 
     finally:
-        connection.close()
\ No newline at end of file
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        print("Timing breakdown: " + json.dumps({k: round(v, 1) if isinstance(v, float) else v for k, v in timings.items()}))
@@ -0,0 +1 @@
+../../Coveo/passage_cache.py
\ No newline at end of file
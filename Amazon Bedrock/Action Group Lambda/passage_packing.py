@@ -0,0 +1 @@
+../../Coveo/passage_packing.py
\ No newline at end of file
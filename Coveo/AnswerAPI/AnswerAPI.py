@@ -1,14 +1,43 @@
-import requests
+import os
+import asyncio
+import sys
 import json
+import threading
+from dataclasses import dataclass, field
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import coveo_client
+import batch
+from answer_cache import AnswerCache, partition_key
+
+TEXT_DELTA = 'genqa.messageType'
+CITATIONS = 'genqa.citationsType'
+END_OF_STREAM = 'genqa.endOfStreamType'
+
+# Payload types decoded by default; every other SSE event is skipped before JSON parsing.
+DEFAULT_PAYLOAD_TYPES = (TEXT_DELTA,)
 
-def make_http_request(input):
+# Shared latency history and hedge budget; pass as hedge= to opt in to hedging.
+hedge_policy = coveo_client.HedgePolicy()
+# Generated answers reused for reworded repeats of the same question; pass use_cache=True to opt in.
+answer_cache = AnswerCache()
+
+@dataclass(frozen=True)
+class AnswerDelta:
+    """One decoded Answer API stream event."""
+    payload_type: str
+    text: str = ''
+    payload: dict = field(default_factory=dict)
+
+def build_request(input):
     organization_id = input['Coveo_Organization_ID']
     search_token = input['Coveo_Search_Token']
     config_id = input['Coveo_Config_ID']
     pipeline = input['Pipeline']
-    search_hub = input['Search_Hub'] 
+    search_hub = input['Search_Hub']
 
-    endpoint = f'https://{organization_id}.org.coveo.com/rest/organizations/{organization_id}/answer/v1/configs/{config_id}/generate'
     headers = {
         'accept': "application/json, text/event-stream",
         'content-type': 'application/json',
@@ -17,7 +46,7 @@ def make_http_request(input):
     }
 
     request_body = {
-        'q': input['User_Query'],  
+        'q': input['User_Query'],
         'searchHub': search_hub,
         'pipeline' : pipeline,
         "context": "{answerAPI:true}",
@@ -30,38 +59,110 @@ def make_http_request(input):
         }
     }
 
-    json_body = json.dumps(request_body)
+    return organization_id, coveo_client.answer_path(organization_id, config_id), headers, request_body
 
-    try:
+def parse_event(line, payload_types=DEFAULT_PAYLOAD_TYPES):
+    """Decode one raw SSE line into an AnswerDelta, or None if it is not wanted.
+
+    The payload type name is matched on the raw bytes first, so events of other
+    types are never JSON-decoded; wanted events are decoded exactly once.
+    """
+    if not line.startswith(b'data: '):
+        return None
+    if not any(payload_type.encode() in line for payload_type in payload_types):
+        return None
+
+    envelope = json.loads(line[6:])
+    payload_type = envelope.get("payloadType")
+    payload_raw = envelope.get("payload")
+    if payload_type not in payload_types or not payload_raw:
+        return None
+
+    payload = json.loads(payload_raw)
+    return AnswerDelta(payload_type, payload.get("textDelta", ""), payload)
 
-        response = requests.post(endpoint, headers=headers, data=json_body, stream=True)
-        full_text = []
+def stream_answer(input, payload_types=DEFAULT_PAYLOAD_TYPES, deadline=None, hedge=None):
+    """Yield AnswerDelta events as soon as they arrive on the Answer API stream.
+
+    The deadline bounds the whole stream, not just each socket read.
+    """
+    organization_id, path, headers, request_body = build_request(input)
+
+    response = None
+    try:
+        response = coveo_client.post(organization_id, path, headers, request_body, stream=True, deadline=deadline, hedge=hedge)
+        response.raise_for_status()
         for line in response.iter_lines():
-            if line:
-                decoded = line.decode("utf-8")
-                if decoded.startswith("data: "):
-                    try:
-                        data_json = json.loads(decoded[6:]) 
-                        payload_type = data_json.get("payloadType")
-                        payload_raw = data_json.get("payload")
-
-                        if payload_raw:
-                            payload = json.loads(payload_raw)
-
-                            if payload_type == "genqa.messageType":
-                                delta = payload.get("textDelta", "")
-                                print(delta, end="")
-                                full_text.append(delta)
-                    except Exception as e:
-                        print("Failed to parse line:", decoded)
-                        print("Error:", e)
-
-        return "".join(full_text)
+            if deadline is not None and deadline.expired:
+                raise coveo_client.DeadlineExceeded('Deadline exceeded while streaming the answer')
+            if not line:
+                continue
+            try:
+                delta = parse_event(line, payload_types)
+            except Exception as e:
+                print("Failed to parse line:", line)
+                print("Error:", e)
+                continue
+            if delta is not None:
+                yield delta
 
     except requests.exceptions.RequestException as e:
-        print(response.__dict__)
+        print(response.__dict__ if response is not None else None)
         print(f'Exception occurred during HTTP callout: {str(e)}')
         raise Exception(f'Failed to send request to Coveo API: {str(e)}')
+    finally:
+        if response is not None:
+            response.close()
+
+async def stream_answer_async(input, payload_types=DEFAULT_PAYLOAD_TYPES, deadline=None, hedge=None):
+    """Async iterator over stream_answer; the blocking read runs in a worker thread."""
+    loop = asyncio.get_running_loop()
+    deltas = asyncio.Queue()
+    stopped = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for delta in stream_answer(input, payload_types, deadline, hedge):
+                if stopped.is_set():
+                    break
+                loop.call_soon_threadsafe(deltas.put_nowait, delta)
+        except Exception as e:
+            loop.call_soon_threadsafe(deltas.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(deltas.put_nowait, done)
+
+    # Keep a reference to the worker so it is not garbage collected mid-stream.
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while True:
+            item = await deltas.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # The worker stops at its next delta and closes the response itself.
+        stopped.set()
+
+def make_http_request(input, deadline=None, hedge=None, use_cache=False):
+    if use_cache:
+        cached = answer_cache.get(partition_key(input), input['User_Query'])
+        if cached is not None:
+            return cached[0]
+
+    answer = "".join(delta.text for delta in stream_answer(input, deadline=deadline, hedge=hedge))
+    if use_cache and answer:
+        answer_cache.put(partition_key(input), input['User_Query'], answer)
+    return answer
+
+async def make_http_request_async(input, deadline=None, hedge=None, use_cache=False):
+    return await asyncio.to_thread(make_http_request, input, deadline, hedge, use_cache)
+
+def make_http_requests(inputs, concurrency=batch.DEFAULT_CONCURRENCY, ordered=True, **kwargs):
+    """make_http_request for every input, `concurrency` at a time; yields batch.BatchResult."""
+    return batch.run_batch(lambda input: make_http_request(input, **kwargs), inputs, concurrency, ordered)
 
 if __name__ == "__main__":
 
@@ -74,4 +175,6 @@ if __name__ == "__main__":
         'Search_Hub' : '[search hub]'
     }
 
-    make_http_request(input_data)
+    for delta in stream_answer(input_data):
+        print(delta.text, end="", flush=True)
+    print()
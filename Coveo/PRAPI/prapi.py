@@ -1,11 +1,33 @@
+import copy
+import os
+import sys
+import asyncio
+
 import requests
-import json
 
-def make_http_request(input):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import coveo_client
+import batch
+from passage_cache import PassageCache, make_key
+from passage_packing import pack_passages
+
+passage_cache = PassageCache()
+# Shared latency history and hedge budget; pass as hedge= to opt in to hedging.
+hedge_policy = coveo_client.HedgePolicy()
+# Token budget for the passages handed to the model; None returns them unprocessed.
+PASSAGE_TOKEN_BUDGET = 2000
+
+def _packed(result, token_budget):
+    # The cache holds the raw response, so packing never compounds across hits
+    # and callers get a copy they are free to change.
+    if token_budget is None:
+        return copy.deepcopy(result)
+    return {**result, 'items': pack_passages(result.get('items', []), token_budget)}
+
+def make_http_request(input, use_cache=True, deadline=None, hedge=None, token_budget=PASSAGE_TOKEN_BUDGET):
     organization_id = input['Coveo_Organization_ID']
     search_token = input['Coveo_Search_Token']
 
-    endpoint = f' https://{organization_id}.org.coveo.com/rest/search/v3/passages/retrieve'
     headers = {
         'Content-Type': 'application/json',
         'Authorization': f'Bearer {search_token}'
@@ -21,19 +43,28 @@ def make_http_request(input):
         'maxPassages': 20
     }
 
-    json_body = json.dumps(request_body)
-
+    cache_key = make_key(request_body['query'], request_body['searchHub'], request_body['localization']['locale'], request_body['maxPassages'], organization_id, search_token)
+    if use_cache:
+        cached = passage_cache.get(cache_key)
+        if cached is not None:
+            return _packed(cached, token_budget)
 
     try:
-        response = requests.post(endpoint, headers=headers, data=json_body)
-        #print(f'HTTP Response Status: {response.status_code}')
-        response.raise_for_status() 
-        return response.json() 
+        result = coveo_client.post_json(organization_id, coveo_client.PASSAGES_PATH, headers, request_body, deadline=deadline, hedge=hedge)
+        passage_cache.put(cache_key, result)
+        return _packed(result, token_budget)
     except requests.exceptions.RequestException as e:
-        print(response)
+        print(e.response)
         #print(f'Exception occurred during HTTP callout: {str(e)}')
         raise Exception(f'Failed to send request to Coveo API: {str(e)}')
 
+async def make_http_request_async(input, use_cache=True, deadline=None, hedge=None, token_budget=PASSAGE_TOKEN_BUDGET):
+    return await asyncio.to_thread(make_http_request, input, use_cache, deadline, hedge, token_budget)
+
+def make_http_requests(inputs, concurrency=batch.DEFAULT_CONCURRENCY, ordered=True, **kwargs):
+    """make_http_request for every input, `concurrency` at a time; yields batch.BatchResult."""
+    return batch.run_batch(lambda input: make_http_request(input, **kwargs), inputs, concurrency, ordered)
+
 if __name__ == "__main__":
 
     input_data = {
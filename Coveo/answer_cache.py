@@ -0,0 +1,242 @@
+"""Similarity cache for Answer API responses.
+
+Queries are embedded locally as hashed character n-gram TF-IDF vectors of
+their stemmed content words, so "How do I reset my router to factory
+settings?" and "resetting the router to factory settings" share one
+generated answer without calling any external service. Each partition
+(organization, search token, searchHub, pipeline, answer config) keeps its
+vectors in one NumPy matrix, and a lookup is a single vectorized cosine
+similarity against every live entry. Answers are generated from the
+documents the token's user may see, so users with different tokens never
+share one. Entries expire after a TTL and the least recently used entry is
+evicted once a partition is full.
+
+Similar is not the same question: of the most similar entries above the
+threshold, the best one that only adds or drops content words is served,
+never one that replaces a word of the query. "How do I reset my router?"
+and "please reset the router" match, "export reports to PDF" and "export
+reports to CSV" do not, however high their cosine. Callers opt in with
+use_cache=True.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Cosine similarity at or above which a cached answer is served.
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES_PER_PARTITION = 256
+DEFAULT_MAX_PARTITIONS = 16
+# Size of the hashed n-gram space; one cached query costs DIMENSIONS * 4 bytes.
+DIMENSIONS = 2 ** 12
+NGRAM_SIZES = (3, 4)
+# Most similar entries checked for matching content words on each lookup.
+TOP_K = 5
+
+_WORD = re.compile(r'\w+')
+# Words that may differ between two queries served the same answer.
+_STOPWORDS = frozenset(
+    'a an and are can could do does how i is me my of please should the to what which would you your'.split()
+)
+
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+
+def stem(word):
+    """Crude suffix stripping, so reset, resets, resetting and reseted compare equal."""
+    if len(word) > 4 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        word = word[:-1]
+    for suffix in ('ing', 'ed'):
+        if len(word) - len(suffix) >= 3 and word.endswith(suffix):
+            word = word[:-len(suffix)]
+            if word[-1] == word[-2] and word[-1] not in 'ls':
+                word = word[:-1]
+            break
+    if len(word) > 3 and word.endswith('e'):
+        word = word[:-1]
+    return word
+
+
+def content_words(query):
+    """Stems of the query's words, stopwords left out, in order."""
+    return [stem(word) for word in _WORD.findall(normalize_query(query)) if word not in _STOPWORDS]
+
+
+def replaces_words(a, b):
+    """Whether each of two content word sets has a word the other lacks (PDF vs CSV, 12 vs 13)."""
+    return bool(a - b) and bool(b - a)
+
+
+def ngram_counts(query, dimensions=DIMENSIONS):
+    """Term-frequency vector of the character n-grams of the query's content words, hashed into `dimensions` buckets."""
+    text = f' {" ".join(content_words(query))} '
+    grams = [hash(text[i:i + n]) % dimensions for n in NGRAM_SIZES for i in range(len(text) - n + 1)]
+    return np.bincount(grams, minlength=dimensions).astype(np.float32)
+
+
+def partition_key(input):
+    token = input.get('Coveo_Search_Token')
+    token_hash = hashlib.sha256(token.encode()).hexdigest() if token else None
+    return (input.get('Coveo_Organization_ID'), token_hash, input.get('Search_Hub'), input.get('Pipeline'), input.get('Coveo_Config_ID'))
+
+
+class _Partition:
+    def __init__(self, capacity, dimensions):
+        self.counts = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.document_frequency = np.zeros(dimensions, dtype=np.float32)
+        self.live = np.zeros(capacity, dtype=bool)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        # slot -> (normalized query, content words of the query, answer), least recently used first
+        self.entries = OrderedDict()
+        self.by_query = {}
+        # IDF weights and weighted row norms, recomputed only after the rows changed.
+        self._weights = None
+
+    def add(self, slot, counts):
+        self.counts[slot] = counts
+        self.document_frequency += counts > 0
+        self.live[slot] = True
+        self._weights = None
+
+    def free_slot(self):
+        free = np.flatnonzero(~self.live)
+        return int(free[0]) if len(free) else None
+
+    def remove(self, slot):
+        query, _, _ = self.entries.pop(slot)
+        self.by_query.pop(query, None)
+        self.document_frequency -= self.counts[slot] > 0
+        self.live[slot] = False
+        self._weights = None
+
+    def similarities(self, counts):
+        """Cosine similarity of counts to every live row, TF-IDF weighted; dead rows score -1."""
+        if self._weights is None:
+            n = self.live.sum()
+            idf = np.log((1 + n) / (1 + self.document_frequency)) + 1
+            self._weights = idf, np.sqrt((self.counts ** 2) @ (idf ** 2))
+        idf, row_norms = self._weights
+        query = counts * idf * idf
+        norms = row_norms * np.linalg.norm(counts * idf)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = (self.counts @ query) / norms
+        return np.where(self.live & (norms > 0), scores, -1.0)
+
+
+class AnswerCache:
+    """Serves a stored answer when a new query is similar enough to a cached one.
+
+    A near match must not replace any content word of the query, so
+    queries that differ in a product, format or number (model 12 vs model
+    13) never match, however similar the rest of the text is.
+    """
+
+    def __init__(
+        self,
+        threshold=DEFAULT_THRESHOLD,
+        ttl_seconds=DEFAULT_TTL_SECONDS,
+        max_entries_per_partition=DEFAULT_MAX_ENTRIES_PER_PARTITION,
+        max_partitions=DEFAULT_MAX_PARTITIONS,
+        dimensions=DIMENSIONS,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_partition = max_entries_per_partition
+        self.max_partitions = max_partitions
+        self.dimensions = dimensions
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _partition(self, key, create):
+        partition = self._partitions.get(key)
+        if partition is None and create:
+            partition = self._partitions[key] = _Partition(self.max_entries_per_partition, self.dimensions)
+            while len(self._partitions) > self.max_partitions:
+                _, evicted = self._partitions.popitem(last=False)
+                self.evictions += len(evicted.entries)
+        if partition is not None:
+            self._partitions.move_to_end(key)
+        return partition
+
+    def _expire(self, partition):
+        expired = np.flatnonzero(partition.live & (partition.expires_at <= time.monotonic()))
+        for slot in expired:
+            partition.remove(int(slot))
+        self.expirations += len(expired)
+
+    def get(self, partition_key, query, top_k=TOP_K):
+        """Return (answer, similarity) of the best cached match, or None."""
+        normalized = normalize_query(query)
+        with self._lock:
+            partition = self._partition(partition_key, create=False)
+            if partition is None:
+                self.misses += 1
+                return None
+            self._expire(partition)
+
+            slot = partition.by_query.get(normalized)
+            score = 1.0
+            if slot is None and partition.entries:
+                scores = partition.similarities(ngram_counts(normalized, self.dimensions))
+                words = frozenset(content_words(normalized))
+                for candidate in np.argsort(-scores)[:top_k]:
+                    score = float(scores[candidate])
+                    if score < self.threshold:
+                        break
+                    if not replaces_words(partition.entries[int(candidate)][1], words):
+                        slot = int(candidate)
+                        self.similar_hits += 1
+                        break
+
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            partition.entries.move_to_end(slot)
+            return partition.entries[slot][2], score
+
+    def put(self, partition_key, query, answer):
+        normalized = normalize_query(query)
+        with self._lock:
+            partition = self._partition(partition_key, create=True)
+            self._expire(partition)
+            if normalized in partition.by_query:
+                partition.remove(partition.by_query[normalized])
+            slot = partition.free_slot()
+            if slot is None:
+                partition.remove(next(iter(partition.entries)))
+                self.evictions += 1
+                slot = partition.free_slot()
+
+            partition.add(slot, ngram_counts(normalized, self.dimensions))
+            partition.expires_at[slot] = time.monotonic() + self.ttl_seconds
+            partition.entries[slot] = (normalized, frozenset(content_words(normalized)), answer)
+            partition.by_query[normalized] = slot
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': sum(len(p.entries) for p in self._partitions.values()),
+            'partitions': len(self._partitions),
+            'hits': self.hits,
+            'similar_hits': self.similar_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
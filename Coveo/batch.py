@@ -0,0 +1,211 @@
+"""Run many Coveo queries with bounded concurrency over the pooled clients.
+
+run_batch() pulls inputs lazily from any iterable and keeps at most a fixed
+window of queries in flight, so memory stays constant no matter how many
+queries are run. Results come back in input order, or as they complete.
+
+As a CLI it streams JSONL in and out, one query per line:
+
+    python batch.py --api prapi queries.jsonl results.jsonl --concurrency 16
+    python batch.py --api answer queries.jsonl - --org myorg --token xx --config-id yy
+    python batch.py --api routed queries.jsonl - --org myorg --token xx --config-id yy
+
+Each input line is either a JSON object of request fields (User_Query,
+Search_Hub, ...) or {"query": "..."}; missing fields come from the options.
+A line that is not valid JSON is reported as a failed result with its line
+number, and the rest of the batch still runs.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import coveo_client
+
+DEFAULT_CONCURRENCY = 8
+# In-order results wait for the oldest query; this many per worker may be queued behind it.
+ORDERED_WINDOW_PER_WORKER = 4
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass
+class BatchResult:
+    index: int
+    input: Any
+    result: Any = None
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+
+
+@dataclass
+class InvalidInput:
+    """An input line that could not be read; run_batch reports it without calling the API."""
+    line_number: int
+    error: str
+
+
+def _timed(call, index, item):
+    if isinstance(item, InvalidInput):
+        return BatchResult(index, item, error=f'line {item.line_number}: {item.error}')
+    start = time.perf_counter()
+    try:
+        result = BatchResult(index, item, result=call(item))
+    except Exception as e:
+        result = BatchResult(index, item, error=f'{type(e).__name__}: {e}')
+    result.elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def run_batch(call, inputs, concurrency=DEFAULT_CONCURRENCY, ordered=True):
+    """Yield a BatchResult for call(input) of every input, running `concurrency` at a time.
+
+    Errors are captured per query instead of stopping the batch. Concurrency
+    above coveo_client.POOL_MAXSIZE opens connections that are not kept alive.
+    """
+    inputs = enumerate(inputs)
+    window = concurrency * ORDERED_WINDOW_PER_WORKER if ordered else concurrency
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='coveo-batch') as executor:
+        def submit():
+            for index, item in inputs:
+                return executor.submit(_timed, call, index, item)
+            return None
+
+        if ordered:
+            pending = deque()
+            while True:
+                while len(pending) < window:
+                    future = submit()
+                    if future is None:
+                        break
+                    pending.append(future)
+                if not pending:
+                    return
+                yield pending.popleft().result()
+        else:
+            pending = set()
+            while True:
+                while len(pending) < window:
+                    future = submit()
+                    if future is None:
+                        break
+                    pending.add(future)
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+
+def _answer_call(AnswerAPI):
+    def call(input):
+        start = time.perf_counter()
+        first, parts = None, []
+        for delta in AnswerAPI.stream_answer(input):
+            if first is None:
+                first = time.perf_counter() - start
+            parts.append(delta.text)
+        return {'answer': ''.join(parts), 'ttfd_ms': None if first is None else round(first * 1000, 2)}
+    return call
+
+
+def _routed_call(router):
+    def call(input):
+        answer = router.answer(input)
+        return {'answer': answer.text, 'source': answer.source}
+    return call
+
+
+def _read_inputs(stream, defaults):
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield InvalidInput(line_number, f'{type(e).__name__}: {e}')
+            continue
+        if isinstance(record, str):
+            record = {'query': record}
+        if not isinstance(record, dict):
+            yield InvalidInput(line_number, f'expected a JSON object or string, got {type(record).__name__}')
+            continue
+        if 'query' in record and 'User_Query' not in record:
+            record['User_Query'] = record.pop('query')
+        yield {**defaults, **record}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--api', choices=('prapi', 'answer', 'routed'), help='routed: Answer API, or passages while it is degraded', required=True)
+    parser.add_argument('input', help='JSONL file of queries, or - for stdin')
+    parser.add_argument('output', help='JSONL file for results, or - for stdout')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--as-completed', action='store_true', help='write results as they complete instead of in input order')
+    parser.add_argument('--no-cache', action='store_true', help='bypass the passage cache (prapi)')
+    parser.add_argument('--org', default=os.environ.get('COVEO_ORG_ID'))
+    parser.add_argument('--token', default=os.environ.get('COVEO_API_KEY'))
+    parser.add_argument('--search-hub', default=os.environ.get('COVEO_SEARCH_HUB'))
+    parser.add_argument('--pipeline', default=os.environ.get('COVEO_PIPELINE'))
+    parser.add_argument('--config-id', default=os.environ.get('COVEO_CONFIG_ID'), help='Answer API configuration id')
+    args = parser.parse_args()
+
+    defaults = {
+        key: value for key, value in (
+            ('Coveo_Organization_ID', args.org),
+            ('Coveo_Search_Token', args.token),
+            ('Search_Hub', args.search_hub),
+            ('Pipeline', args.pipeline),
+            ('Coveo_Config_ID', args.config_id),
+        ) if value is not None
+    }
+
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    sink = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    if args.api == 'prapi':
+        sys.path.insert(0, os.path.join(HERE, 'PRAPI'))
+        import prapi
+        results = prapi.make_http_requests(_read_inputs(source, defaults), args.concurrency, not args.as_completed, use_cache=not args.no_cache)
+    elif args.api == 'routed':
+        import router
+        results = run_batch(_routed_call(router.router), _read_inputs(source, defaults), args.concurrency, not args.as_completed)
+    else:
+        sys.path.insert(0, os.path.join(HERE, 'AnswerAPI'))
+        import AnswerAPI
+        results = run_batch(_answer_call(AnswerAPI), _read_inputs(source, defaults), args.concurrency, not args.as_completed)
+
+    errors = total = 0
+    start = time.perf_counter()
+    try:
+        for result in results:
+            total += 1
+            errors += result.error is not None
+            sink.write(json.dumps({
+                'index': result.index,
+                'query': result.input.get('User_Query') if isinstance(result.input, dict) else None,
+                'elapsed_ms': result.elapsed_ms,
+                'result': result.result,
+                'error': result.error,
+            }) + '\n')
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+        coveo_client.close()
+
+    elapsed = time.perf_counter() - start
+    if args.api == 'routed':
+        print(json.dumps(router.router.stats()), file=sys.stderr)
+    print(f'{total} queries, {errors} errors in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} q/s)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
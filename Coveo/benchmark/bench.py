@@ -0,0 +1,181 @@
+"""Offline benchmark for the Coveo clients against the local stub server.
+
+Measures AnswerAPI.stream_answer, prapi.make_http_request and the Bedrock
+action Lambda's lambda_handler, and reports throughput, time to first delta,
+latency percentiles and peak memory allocated per request.
+
+    python bench.py --scenario all --requests 200 --concurrency 8
+    python bench.py --scenario answer --error-rate 0.05 --words-per-delta 1 --json
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import stub_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COVEO_DIR = os.path.dirname(HERE)
+LAMBDA_DIR = os.path.join(os.path.dirname(COVEO_DIR), 'Amazon Bedrock', 'Action Group Lambda')
+
+SCENARIOS = ('answer', 'prapi', 'lambda')
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def load_clients(base_url, host_port):
+    """Import the clients pointed at the stub instead of *.org.coveo.com."""
+    os.environ['COVEO_SERVER'] = host_port
+    os.environ['COVEO_PLAIN_HTTP'] = '1'
+    for path in (COVEO_DIR, os.path.join(COVEO_DIR, 'AnswerAPI'), os.path.join(COVEO_DIR, 'PRAPI'), LAMBDA_DIR):
+        sys.path.insert(0, path)
+
+    import coveo_client
+    coveo_client.BASE_URL = base_url
+    import AnswerAPI
+    import prapi
+    import action
+    return AnswerAPI, prapi, action
+
+
+def make_scenario(name, clients):
+    AnswerAPI, prapi, action = clients
+
+    def input_for(i):
+        return {
+            'Coveo_Organization_ID': 'stuborg',
+            'Coveo_Search_Token': 'stub-token',
+            'Coveo_Config_ID': 'stub-config',
+            'Pipeline': 'stub',
+            'Search_Hub': 'stub',
+            'User_Query': f'how do I reset device model {i}',
+        }
+
+    def answer(i):
+        start = time.perf_counter()
+        first = None
+        for _ in AnswerAPI.stream_answer(input_for(i)):
+            if first is None:
+                first = time.perf_counter() - start
+        return first, time.perf_counter() - start
+
+    def passages(i):
+        start = time.perf_counter()
+        prapi.make_http_request(input_for(i), use_cache=False)
+        return None, time.perf_counter() - start
+
+    def lambda_handler(i):
+        event = {
+            'apiPath': '/rest/search/v3/passages/retrieve',
+            'inputText': f'how do I reset device model {i}',
+            'sessionAttributes': {'bypassPassageCache': 'true'},
+        }
+        start = time.perf_counter()
+        action.lambda_handler(event, None)
+        return None, time.perf_counter() - start
+
+    return {'answer': answer, 'prapi': passages, 'lambda': lambda_handler}[name]
+
+
+def run(name, call, requests, concurrency, allocation_samples):
+    # The clients print errors and the Lambda logs sizes and timings; keep that out of the report.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return _run(name, call, requests, concurrency, allocation_samples)
+
+
+def _run(name, call, requests, concurrency, allocation_samples):
+    ttfd, latency, errors = [], [], 0
+
+    def one(i):
+        try:
+            return call(i)
+        except Exception:
+            return None
+
+    # Warm the connection pools so the first handshake does not skew percentiles.
+    one(-1)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for result in executor.map(one, range(requests)):
+            if result is None:
+                errors += 1
+                continue
+            first, total = result
+            latency.append(total)
+            if first is not None:
+                ttfd.append(first)
+    elapsed = time.perf_counter() - start
+
+    allocated = []
+    tracemalloc.start()
+    for i in range(allocation_samples):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        one(requests + i)
+        allocated.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'scenario': name,
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'throughput_rps': round(len(latency) / elapsed, 1) if elapsed else None,
+        'ttfd_ms': {f'p{p}': ms(percentile(ttfd, p)) for p in (50, 95, 99)} if ttfd else None,
+        'latency_ms': {f'p{p}': ms(percentile(latency, p)) for p in (50, 95, 99)},
+        'latency_mean_ms': ms(statistics.fmean(latency)) if latency else None,
+        'peak_alloc_kib_per_request': round(statistics.fmean(allocated) / 1024, 1) if allocated else None,
+    }
+
+
+def print_report(result):
+    print(f"\n== {result['scenario']} ({result['requests']} requests, concurrency {result['concurrency']}) ==")
+    print(f"throughput         {result['throughput_rps']} req/s, {result['errors']} errors")
+    if result['ttfd_ms']:
+        print('time to 1st delta  p50 {p50} ms  p95 {p95} ms  p99 {p99} ms'.format(**result['ttfd_ms']))
+    print('total latency      p50 {p50} ms  p95 {p95} ms  p99 {p99} ms'.format(**result['latency_ms']))
+    print(f"peak allocation    {result['peak_alloc_kib_per_request']} KiB/request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--allocation-samples', type=int, default=20, help='sequential requests traced with tracemalloc')
+    parser.add_argument('--json', action='store_true', help='print one JSON object per scenario instead of a table')
+    stub_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = stub_server.start(stub_server.config_from_args(args))
+    host_port = f'127.0.0.1:{server.server_port}'
+    clients = load_clients(f'http://{host_port}', host_port)
+
+    for name in SCENARIOS if args.scenario == 'all' else (args.scenario,):
+        # A Lambda container serves one invocation at a time.
+        concurrency = 1 if name == 'lambda' else args.concurrency
+        result = run(name, make_scenario(name, clients), args.requests, concurrency, args.allocation_samples)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print_report(result)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
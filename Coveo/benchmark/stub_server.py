@@ -0,0 +1,183 @@
+"""Local stand-in for the Coveo Answer API and Passage Retrieval API.
+
+Replays realistic `genqa.*` SSE streams and passage payloads with
+configurable latency, chunk sizes and error rates, so the clients can be
+benchmarked without touching a real organization.
+
+    python stub_server.py --port 8765 --first-byte-ms 150 --delta-interval-ms 15
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER_PATH = re.compile(r'^/rest/organizations/[^/]+/answer/v1/configs/[^/]+/generate')
+PASSAGES_PATH = '/rest/search/v3/passages/retrieve'
+
+WORDS = (
+    'the device supports firmware updates over the network and keeps its configuration '
+    'after a reset unless the factory defaults option is selected in the settings menu'
+).split()
+
+
+@dataclass
+class StubConfig:
+    first_byte_ms: float = 100.0
+    delta_interval_ms: float = 10.0
+    answer_words: int = 200
+    words_per_delta: int = 3
+    passage_latency_ms: float = 80.0
+    passage_words: int = 120
+    error_rate: float = 0.0
+    jitter: float = 0.2
+
+
+def _sleep_ms(ms, jitter):
+    if ms > 0:
+        time.sleep(ms * random.uniform(1 - jitter, 1 + jitter) / 1000)
+
+
+def _text(words):
+    return ' '.join(WORDS[i % len(WORDS)] for i in range(words))
+
+
+def sse_event(payload_type, payload, final=False):
+    envelope = {'payloadType': payload_type, 'payload': json.dumps(payload), 'finalResponse': final}
+    return f'data: {json.dumps(envelope)}\n\n'.encode()
+
+
+def answer_events(config):
+    yield sse_event('genqa.headerMessageType', {'contentFormat': 'text/markdown'})
+    words = _text(config.answer_words).split()
+    for i in range(0, len(words), config.words_per_delta):
+        yield sse_event('genqa.messageType', {'textDelta': ' '.join(words[i:i + config.words_per_delta]) + ' '})
+    yield sse_event('genqa.citationsType', {'citations': [
+        {'id': f'c{i}', 'title': f'Document {i}', 'uri': f'https://example.com/docs/{i}', 'clickUri': f'https://example.com/docs/{i}'}
+        for i in range(3)
+    ]})
+    yield sse_event('genqa.endOfStreamType', {'answerGenerated': True}, final=True)
+
+
+def passages_payload(config, query, max_passages):
+    return {
+        'items': [
+            {
+                'text': f'{query}: {_text(config.passage_words)}',
+                'relevanceScore': round(1.0 - i / (max_passages + 1), 4),
+                'document': {
+                    'title': f'Document {i // 2}',
+                    'primaryid': f'doc-{i // 2}',
+                    'clickableuri': f'https://example.com/docs/{i // 2}',
+                },
+            }
+            for i in range(max_passages)
+        ],
+        'responseId': 'stub',
+    }
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Buffer writes so headers and small bodies leave in one segment, and
+        # send each SSE event right away instead of waiting on delayed ACKs.
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _fail(self):
+            body = b'{"message": "stub error"}'
+            self.send_response(503)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            self.wfile.flush()
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            path = self.path.split('?')[0]
+
+            if path == PASSAGES_PATH:
+                _sleep_ms(config.passage_latency_ms, config.jitter)
+                if random.random() < config.error_rate:
+                    return self._fail()
+                payload = json.dumps(passages_payload(config, body.get('query', ''), body.get('maxPassages', 5))).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                self.wfile.flush()
+                return
+
+            if ANSWER_PATH.match(path):
+                _sleep_ms(config.first_byte_ms, config.jitter)
+                if random.random() < config.error_rate:
+                    return self._fail()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for event in answer_events(config):
+                    self.wfile.write(f'{len(event):x}\r\n'.encode() + event + b'\r\n')
+                    self.wfile.flush()
+                    _sleep_ms(config.delta_interval_ms, config.jitter)
+                self.wfile.write(b'0\r\n\r\n')
+                self.wfile.flush()
+                return
+
+            self.send_error(404)
+
+    return Handler
+
+
+def start(config=None, host='127.0.0.1', port=0):
+    """Start the stub on a background thread; returns the server (see server.server_port)."""
+    server = ThreadingHTTPServer((host, port), make_handler(config or StubConfig()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='coveo-stub', daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    defaults = StubConfig()
+    parser.add_argument('--first-byte-ms', type=float, default=defaults.first_byte_ms, help='Answer API delay before the first event')
+    parser.add_argument('--delta-interval-ms', type=float, default=defaults.delta_interval_ms, help='delay between Answer API events')
+    parser.add_argument('--answer-words', type=int, default=defaults.answer_words)
+    parser.add_argument('--words-per-delta', type=int, default=defaults.words_per_delta, help='chunk size of each textDelta')
+    parser.add_argument('--passage-latency-ms', type=float, default=defaults.passage_latency_ms)
+    parser.add_argument('--passage-words', type=int, default=defaults.passage_words)
+    parser.add_argument('--error-rate', type=float, default=defaults.error_rate, help='fraction of requests answered with 503')
+    parser.add_argument('--jitter', type=float, default=defaults.jitter, help='relative +/- jitter applied to every delay')
+
+
+def config_from_args(args):
+    return StubConfig(
+        first_byte_ms=args.first_byte_ms,
+        delta_interval_ms=args.delta_interval_ms,
+        answer_words=args.answer_words,
+        words_per_delta=args.words_per_delta,
+        passage_latency_ms=args.passage_latency_ms,
+        passage_words=args.passage_words,
+        error_rate=args.error_rate,
+        jitter=args.jitter,
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config_from_args(args)))
+    print(f'Coveo stub listening on http://{args.host}:{args.port}')
+    server.serve_forever()
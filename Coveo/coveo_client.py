@@ -0,0 +1,113 @@
+"""Shared, pooled HTTP client for the Coveo Answer API and Passage Retrieval API.
+
+One keep-alive requests.Session is kept per organization, so every call to
+{org}.org.coveo.com reuses a warm TCP/TLS connection instead of paying the
+DNS, TCP and TLS handshake on each query. The async functions run the same
+pooled calls in a worker thread so they can be awaited from agent code.
+"""
+import asyncio
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Re-exported so callers only need to import coveo_client.
+from hedging import Deadline, DeadlineExceeded, HedgePolicy
+
+PASSAGES_PATH = '/rest/search/v3/passages/retrieve'
+
+# Overrides https://{org}.org.coveo.com, e.g. to point at Coveo/benchmark/stub_server.py.
+BASE_URL = os.environ.get('COVEO_BASE_URL')
+
+# Number of hosts and connections per host kept alive for each organization.
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def org_base_url(organization_id):
+    if BASE_URL:
+        return BASE_URL.rstrip('/')
+    return f'https://{organization_id}.org.coveo.com'
+
+
+def answer_path(organization_id, config_id):
+    return f'/rest/organizations/{organization_id}/answer/v1/configs/{config_id}/generate'
+
+
+def get_session(organization_id):
+    """Return the pooled session for an organization, creating it on first use."""
+    session = _sessions.get(organization_id)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(organization_id)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _sessions[organization_id] = session
+    return session
+
+
+def _post(organization_id, path, headers, body, stream, timeout):
+    session = get_session(organization_id)
+    return session.post(
+        org_base_url(organization_id) + path,
+        headers=headers,
+        data=json.dumps(body),
+        stream=stream,
+        timeout=timeout,
+    )
+
+
+def _post_json(organization_id, path, headers, body, timeout):
+    response = _post(organization_id, path, headers, body, False, timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def post(organization_id, path, headers, body, stream=False, timeout=None, deadline=None, hedge=None):
+    """POST a JSON body to the organization's Coveo endpoint over the pooled session.
+
+    With a deadline, the request gets the time left as its timeout; with a
+    HedgePolicy, a slow request is duplicated and the first response wins.
+    """
+    if deadline is not None:
+        timeout = deadline.timeout(timeout)
+    if hedge is None:
+        return _post(organization_id, path, headers, body, stream, timeout)
+    return hedge.run(
+        lambda: _post(organization_id, path, headers, body, stream, timeout),
+        discard=lambda response: response.close(),
+        deadline=deadline,
+    )
+
+
+def post_json(organization_id, path, headers, body, timeout=None, deadline=None, hedge=None):
+    """POST and return the decoded JSON response, raising on HTTP errors."""
+    if deadline is not None:
+        timeout = deadline.timeout(timeout)
+    if hedge is None:
+        return _post_json(organization_id, path, headers, body, timeout)
+    return hedge.run(lambda: _post_json(organization_id, path, headers, body, timeout), deadline=deadline)
+
+
+async def post_async(organization_id, path, headers, body, stream=False, timeout=None, deadline=None, hedge=None):
+    return await asyncio.to_thread(post, organization_id, path, headers, body, stream, timeout, deadline, hedge)
+
+
+async def post_json_async(organization_id, path, headers, body, timeout=None, deadline=None, hedge=None):
+    return await asyncio.to_thread(post_json, organization_id, path, headers, body, timeout, deadline, hedge)
+
+
+def close():
+    """Close every pooled session, e.g. on process shutdown."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,159 @@
+"""Request deadlines and hedged requests for the Coveo client.
+
+A Deadline is created once per user request and passed down to every HTTP
+call, which then gets whatever time is left as its timeout. A HedgePolicy
+sends a duplicate request when the first one is slower than a recent latency
+percentile and keeps whichever answers first. Hedges spend a RetryBudget, so
+they stop when the service is degraded instead of doubling its load.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+# Hedges run on this shared pool, bounded so they can never exhaust threads.
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='coveo-hedge')
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def after_ms(cls, milliseconds):
+        return cls(milliseconds / 1000)
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, timeout=None):
+        """Timeout for the next call: the time left, capped by an explicit timeout."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded('Deadline exceeded before the request was sent')
+        return remaining if timeout is None else min(timeout, remaining)
+
+
+class LatencyTracker:
+    """Recent request latencies, for percentile-based hedge delays."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+class RetryBudget:
+    """Every request earns `ratio` of a hedge; each hedge spends one.
+
+    With ratio=0.1, at most ~10% extra load is ever sent as hedges.
+    """
+
+    def __init__(self, ratio=0.1, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class HedgePolicy:
+    """Duplicates a request once it is slower than the recent latency percentile."""
+
+    def __init__(self, percentile=95, min_delay_seconds=0.05, default_delay_seconds=1.0, budget=None, tracker=None):
+        self.percentile = percentile
+        self.min_delay_seconds = min_delay_seconds
+        self.default_delay_seconds = default_delay_seconds
+        self.budget = budget or RetryBudget()
+        self.tracker = tracker or LatencyTracker()
+        self.hedges = 0
+        self.hedge_wins = 0
+        # Counters are updated from the caller threads of every concurrent request.
+        self._lock = threading.Lock()
+
+    def delay(self):
+        observed = self.tracker.percentile(self.percentile)
+        if observed is None:
+            return self.default_delay_seconds
+        return max(self.min_delay_seconds, observed)
+
+    def run(self, call, discard=None, deadline=None):
+        """Run call(), hedging it once if needed; discard(result) releases a losing result."""
+        start = time.monotonic()
+        self.budget.deposit()
+        primary = _executor.submit(call)
+
+        delay = self.delay()
+        # A hedge sent when the deadline expires cannot win; then just wait on the primary.
+        if deadline is not None and deadline.remaining() <= delay:
+            futures = [primary]
+        elif wait([primary], timeout=delay)[0] or not self.budget.withdraw():
+            futures = [primary]
+        else:
+            with self._lock:
+                self.hedges += 1
+            futures = [primary, _executor.submit(call)]
+
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining() if deadline is not None else None, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            winner = None
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                elif winner is None:
+                    winner = future
+                elif discard is not None:
+                    discard(future.result())
+            if winner is not None:
+                if winner is not primary:
+                    with self._lock:
+                        self.hedge_wins += 1
+                self.tracker.record(time.monotonic() - start)
+                _discard_when_done(pending, discard)
+                return winner.result()
+
+        if error is not None:
+            raise error
+        _discard_when_done(pending, discard)
+        raise DeadlineExceeded('Deadline exceeded while waiting for the Coveo API')
+
+
+def _discard_when_done(futures, discard):
+    if discard is None:
+        return
+    for future in futures:
+        future.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
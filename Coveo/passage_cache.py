@@ -0,0 +1,77 @@
+"""Bounded in-process cache for Passage Retrieval API results.
+
+Entries expire after a TTL and the least recently used entry is evicted once
+the cache is full. Keys are built from the normalized query plus the request
+parameters that change the result (searchHub, locale, maxPassages) and a
+hash of the search token, whose permissions and filters decide which
+passages a user may see.
+
+The Action Group Lambda imports this module through a symlink; edit it here.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 300
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+def make_key(query, search_hub, locale, max_passages, organization_id=None, search_token=None):
+    token_hash = hashlib.sha256(search_token.encode()).hexdigest() if search_token else None
+    return (organization_id, token_hash, normalize_query(query), search_hub, locale, max_passages)
+
+
+class PassageCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None when missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
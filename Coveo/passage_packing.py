@@ -0,0 +1,111 @@
+"""Post-retrieval stage that makes Passage Retrieval API results denser.
+
+Passages are ranked by relevanceScore, near-duplicates are dropped (Jaccard
+similarity of word shingles) and the best passages are packed into a token
+budget. Kept passages of the same document (clickableuri) whose windows
+overlap are then stitched into one. Packing goes passage by passage, so
+the best passage of a document is never lost because its siblings are
+long. Items keep the API's shape, so callers can use the result in place
+of response['items'].
+
+The Action Group Lambda imports this module through a symlink; edit it here.
+"""
+import re
+
+# Rough size of a token, as used to budget the agent's prompt.
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 2000
+# Passages at least this similar to a better-ranked one are dropped.
+DEFAULT_DUPLICATE_THRESHOLD = 0.7
+SHINGLE_SIZE = 3
+# Shortest word overlap between the end of one passage and the start of the next that is stitched.
+MIN_STITCH_WORDS = 5
+
+_WORD = re.compile(r'\w+')
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _score(item):
+    return item.get('relevanceScore') or item.get('score') or 0.0
+
+
+def _uri(item):
+    return (item.get('document') or {}).get('clickableuri') or item.get('clickableuri')
+
+
+def deduplicate(items, threshold=DEFAULT_DUPLICATE_THRESHOLD):
+    """Keep items (best first) that are not near-duplicates of an item already kept."""
+    kept, kept_shingles = [], []
+    for item in sorted(items, key=_score, reverse=True):
+        current = shingles(item.get('text', ''))
+        if any(jaccard(current, other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(item)
+        kept_shingles.append(current)
+    return kept
+
+
+def _stitch(first, second):
+    """Join two windows of one document at their shared words, or None if they do not overlap."""
+    a, b = first.split(), second.split()
+    for overlap in range(min(len(a), len(b)), MIN_STITCH_WORDS - 1, -1):
+        if a[-overlap:] == b[:overlap]:
+            return ' '.join(a + b[overlap:])
+    return None
+
+
+def merge_by_document(items):
+    """Stitch items sharing a clickableuri into the best-ranked one they overlap with.
+
+    Passages of one document that do not overlap stay separate items.
+    """
+    merged, by_uri = [], {}
+    for item in items:
+        uri = _uri(item)
+        text = item.get('text', '')
+        for target in by_uri.get(uri, []) if uri is not None else []:
+            stitched = _stitch(target['text'], text) or _stitch(text, target['text'])
+            if stitched is not None:
+                target['text'] = stitched
+                break
+        else:
+            copy = dict(item)
+            merged.append(copy)
+            if uri is not None:
+                by_uri.setdefault(uri, []).append(copy)
+    return merged
+
+
+def pack(items, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Greedily keep the best items that fit; the top item is truncated if nothing fits."""
+    packed, used = [], 0
+    for item in items:
+        tokens = estimate_tokens(item.get('text', ''))
+        if used + tokens <= token_budget:
+            packed.append(item)
+            used += tokens
+    if not packed and items:
+        text = items[0].get('text', '')[:token_budget * CHARS_PER_TOKEN]
+        packed.append({**items[0], 'text': text.rsplit(' ', 1)[0] if ' ' in text else text})
+    return packed
+
+
+def pack_passages(items, token_budget=DEFAULT_TOKEN_BUDGET, duplicate_threshold=DEFAULT_DUPLICATE_THRESHOLD):
+    """Deduplicate and pack passages into token_budget, best first, then stitch overlapping windows."""
+    return merge_by_document(pack(deduplicate(items, duplicate_threshold), token_budget))
@@ -0,0 +1,271 @@
+"""Latency-aware routing between the Answer API and the Passage Retrieval API.
+
+Every Answer API call updates an exponentially weighted moving average of
+its latency and error rate. When either crosses its limit a circuit breaker
+opens and answers are built locally from passages for a while; after the
+cool-down a single request probes the Answer API (half-open) and closes
+the breaker again if it succeeds. Answer API calls also get a capped share
+of the deadline, so there is always time left to fall back to passages and
+tail latency stays bounded during an incident.
+
+    answer = router.make_http_request(input, deadline=coveo_client.Deadline(15))
+"""
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'AnswerAPI'))
+sys.path.insert(0, os.path.join(HERE, 'PRAPI'))
+import coveo_client
+import AnswerAPI
+import prapi
+from answer_cache import partition_key
+
+# Weight of the newest sample in the latency and error rate averages.
+EWMA_ALPHA = 0.2
+# The breaker opens when the Answer API's average error rate or latency crosses these...
+ERROR_RATE_THRESHOLD = 0.5
+LATENCY_BUDGET_SECONDS = 8.0
+# ...but only once this many calls were observed since it last closed.
+MIN_REQUESTS = 5
+# How long answers come from passages before the Answer API is probed again.
+OPEN_SECONDS = 30.0
+# Longest an Answer API call may take, and the time always kept for the passage fallback.
+ANSWER_TIMEOUT_SECONDS = 12.0
+FALLBACK_RESERVE_SECONDS = 3.0
+# Sentences of the passages used for a locally synthesized answer.
+SYNTHESIS_SENTENCES = 4
+SYNTHESIS_MAX_CHARS = 1200
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+_WORD = re.compile(r'\w+')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_STOPWORDS = frozenset(
+    'a an and are can do does for from how i in is it my of on or the to what when where which who why with you your'.split()
+)
+
+
+class EndpointStats:
+    """Moving averages of one endpoint's latency and error rate."""
+
+    def __init__(self, alpha=EWMA_ALPHA):
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.requests += 1
+            self.latency = seconds if self.latency is None else self.alpha * seconds + (1 - self.alpha) * self.latency
+            self.error_rate = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * self.error_rate
+
+    def reset(self):
+        with self._lock:
+            self.latency = None
+            self.error_rate = 0.0
+            self.requests = 0
+
+    def summary(self):
+        return {
+            'latency_ms': None if self.latency is None else round(self.latency * 1000, 1),
+            'error_rate': round(self.error_rate, 3),
+            'requests': self.requests,
+        }
+
+
+class CircuitBreaker:
+    """Opens when an endpoint is failing or too slow, then lets one probe through after a cool-down."""
+
+    def __init__(
+        self,
+        stats,
+        error_rate_threshold=ERROR_RATE_THRESHOLD,
+        latency_budget_seconds=LATENCY_BUDGET_SECONDS,
+        min_requests=MIN_REQUESTS,
+        open_seconds=OPEN_SECONDS,
+    ):
+        self.stats = stats
+        self.error_rate_threshold = error_rate_threshold
+        self.latency_budget_seconds = latency_budget_seconds
+        self.min_requests = min_requests
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether this request may use the endpoint; in half-open state only the probe may."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, seconds, ok):
+        self.stats.record(seconds, ok)
+        with self._lock:
+            if self.state == HALF_OPEN and self._probing:
+                self._probing = False
+                if ok and seconds <= self.latency_budget_seconds:
+                    self.state = CLOSED
+                    self.stats.reset()
+                else:
+                    self._open()
+            elif self.state == CLOSED and self._degraded():
+                self._open()
+
+    def _degraded(self):
+        if self.stats.requests < self.min_requests:
+            return False
+        return self.stats.error_rate >= self.error_rate_threshold or self.stats.latency > self.latency_budget_seconds
+
+    def _open(self):
+        self.state = OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+
+
+@dataclass
+class RoutedAnswer:
+    text: str
+    # 'answer', 'answer_cache' or 'passages'
+    source: str
+    items: list = field(default_factory=list)
+
+
+def _terms(text):
+    return {word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS}
+
+
+def synthesize(query, items, max_sentences=SYNTHESIS_SENTENCES, max_chars=SYNTHESIS_MAX_CHARS):
+    """Extractive answer: the passage sentences sharing most words with the query, then their sources."""
+    terms = _terms(query)
+    scored = []
+    for rank, item in enumerate(items):
+        for position, sentence in enumerate(_SENTENCE_END.split(item.get('text', '').strip())):
+            overlap = len(terms & _terms(sentence))
+            if overlap:
+                # Better-ranked passages win ties.
+                scored.append((overlap / (1 + 0.1 * rank), rank, position, sentence))
+    if not scored:
+        if not items:
+            return ''
+        scored = [(0, 0, 0, items[0].get('text', ''))]
+
+    chosen = sorted(sorted(scored, reverse=True)[:max_sentences], key=lambda entry: (entry[1], entry[2]))
+    text = ' '.join(sentence for _, _, _, sentence in chosen)
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(' ', 1)[0] + '…'
+
+    sources = []
+    for rank in dict.fromkeys(entry[1] for entry in chosen):
+        document = items[rank].get('document') or {}
+        source = document.get('title') or document.get('clickableuri')
+        if source and document.get('clickableuri') and source != document['clickableuri']:
+            source = f"{source} ({document['clickableuri']})"
+        if source and source not in sources:
+            sources.append(source)
+    if sources:
+        text += '\n\nSources:\n' + '\n'.join(f'- {source}' for source in sources)
+    return text
+
+
+class Router:
+    """Serves answers from the Answer API while it is healthy, and from passages otherwise."""
+
+    def __init__(
+        self,
+        breaker=None,
+        answer_timeout_seconds=ANSWER_TIMEOUT_SECONDS,
+        fallback_reserve_seconds=FALLBACK_RESERVE_SECONDS,
+    ):
+        self.breaker = breaker or CircuitBreaker(EndpointStats())
+        self.answer_stats = self.breaker.stats
+        self.passages_stats = EndpointStats()
+        self.answer_timeout_seconds = answer_timeout_seconds
+        self.fallback_reserve_seconds = fallback_reserve_seconds
+        self.routed = {'answer': 0, 'answer_cache': 0, 'passages': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, source):
+        with self._lock:
+            self.routed[source] += 1
+
+    def _answer_deadline(self, deadline):
+        seconds = self.answer_timeout_seconds
+        if deadline is not None:
+            seconds = min(seconds, deadline.remaining() - self.fallback_reserve_seconds)
+        return coveo_client.Deadline(seconds) if seconds > 0 else None
+
+    def answer(self, input, deadline=None, hedge=None, use_cache=False):
+        """Answer input['User_Query'] with the Answer API, or from passages if it is degraded or fails."""
+        cached = AnswerAPI.answer_cache.get(partition_key(input), input['User_Query']) if use_cache else None
+        if cached is not None:
+            self._count('answer_cache')
+            return RoutedAnswer(cached[0], 'answer_cache')
+
+        answer_deadline = self._answer_deadline(deadline)
+        if answer_deadline is not None and self.breaker.allow():
+            start = time.monotonic()
+            ok = False
+            try:
+                text = AnswerAPI.make_http_request(input, deadline=answer_deadline, hedge=hedge, use_cache=False)
+                ok = True
+            except Exception as e:
+                print(f'Answer API failed, answering from passages: {e}')
+            finally:
+                self.breaker.record(time.monotonic() - start, ok)
+            # An empty answer means the Answer API had nothing to generate from, not that it is unhealthy.
+            if ok and text:
+                if use_cache:
+                    AnswerAPI.answer_cache.put(partition_key(input), input['User_Query'], text)
+                self._count('answer')
+                return RoutedAnswer(text, 'answer')
+
+        start = time.monotonic()
+        try:
+            result = prapi.make_http_request(input, deadline=deadline, hedge=hedge)
+        except Exception:
+            self.passages_stats.record(time.monotonic() - start, False)
+            raise
+        self.passages_stats.record(time.monotonic() - start, True)
+        items = result.get('items', [])
+        self._count('passages')
+        return RoutedAnswer(synthesize(input['User_Query'], items), 'passages', items)
+
+    def stats(self):
+        with self._lock:
+            routed = dict(self.routed)
+        return {
+            'breaker': self.breaker.state,
+            'breaker_opened': self.breaker.opened,
+            'answer_api': self.answer_stats.summary(),
+            'passages': self.passages_stats.summary(),
+            'routed': routed,
+        }
+
+
+# Shared by every caller in the process, so all requests see the same endpoint health.
+router = Router()
+
+
+def make_http_request(input, deadline=None, hedge=None, use_cache=False):
+    return router.answer(input, deadline=deadline, hedge=hedge, use_cache=use_cache).text
+
+
+async def make_http_request_async(input, deadline=None, hedge=None, use_cache=False):
+    return await asyncio.to_thread(make_http_request, input, deadline, hedge, use_cache)